@@ -0,0 +1,108 @@
+import json
+import os
+import time
+
+from llm_cache import TRANSPORT_KWARGS
+
+
+FINISHED_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+# Write one Batch API request per custom_id, each body being the chat.completions.create kwargs
+def write_batch_file(path, requests):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for custom_id, kwargs in requests.items():
+            body = {k: v for k, v in kwargs.items() if k not in TRANSPORT_KWARGS}
+            f.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': '/v1/chat/completions', 'body': body}) + '\n')
+
+
+# fn(*args, **kwargs) through the retry policy, if there is one. A batch is polled for up to 24h, so
+# one dropped connection must not end the run
+def retried(retry_policy, fn, *args, **kwargs):
+    if retry_policy is None:
+        return fn(*args, **kwargs)
+    return retry_policy.call(lambda call_kwargs: fn(*args, **kwargs, **call_kwargs), {})
+
+
+def submit_batch(client, path, description=None, retry_policy=None):
+    # opened per attempt, so a retried upload sends the whole file again
+    def upload(**kwargs):
+        with open(path, 'rb') as f:
+            return client.files.create(file=f, purpose='batch', **kwargs)
+
+    input_file = retried(retry_policy, upload)
+    batch = retried(retry_policy, client.batches.create, input_file_id=input_file.id, endpoint='/v1/chat/completions',
+                    completion_window='24h', metadata={'description': description or path})
+    print(f"submitted batch {batch.id} ({path})")
+    return batch
+
+
+def wait_for_batch(client, batch_id, poll_interval=30, retry_policy=None):
+    while True:
+        batch = retried(retry_policy, client.batches.retrieve, batch_id)
+        if batch.status in FINISHED_STATUSES:
+            print(f"batch {batch_id} {batch.status}: {batch.request_counts}")
+            return batch
+        print(f"batch {batch_id} {batch.status}, checking again in {poll_interval}s")
+        time.sleep(poll_interval)
+
+
+# Map custom_id to ChatCompletion for every request that succeeded, and to an error message for the rest
+def read_batch_results(client, batch, retry_policy=None):
+    from openai.types.chat import ChatCompletion
+
+    responses = {}
+    errors = {}
+
+    if batch.output_file_id:
+        for line in retried(retry_policy, client.files.content, batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get('response') or {}
+            if result.get('error') or response.get('status_code') != 200:
+                errors[result['custom_id']] = result.get('error') or response.get('body')
+            else:
+                responses[result['custom_id']] = ChatCompletion.model_validate(response['body'])
+
+    if batch.error_file_id:
+        for line in retried(retry_policy, client.files.content, batch.error_file_id).text.splitlines():
+            if line.strip():
+                result = json.loads(line)
+                errors[result['custom_id']] = result.get('error')
+
+    return responses, errors
+
+
+def submitted_batch(manifest, path, requests):
+    # The id of a batch an earlier run submitted from path and never finished reading, if it covers
+    # every request; --resume polls it again instead of paying for a new one
+    record = manifest.get(path, 'batch') if manifest is not None else None
+    if record is None or record.get('done') or not set(requests) <= set(record['custom_ids']):
+        return None
+    return record['batch_id']
+
+
+def run_batch(client, path, requests, poll_interval=30, retry_policy=None, manifest=None):
+    # With a manifest, the submitted batch is journaled under its request file's path before it is
+    # polled, and marked done once its results have been read
+    if not requests:
+        return {}
+
+    batch_id = submitted_batch(manifest, path, requests)
+    if batch_id is not None:
+        print(f"resuming batch {batch_id} ({path})")
+    else:
+        write_batch_file(path, requests)
+        batch_id = submit_batch(client, path, retry_policy=retry_policy).id
+        if manifest is not None:
+            manifest.mark(path, 'batch', batch_id=batch_id, custom_ids=sorted(requests))
+    batch = wait_for_batch(client, batch_id, poll_interval, retry_policy)
+    responses, errors = read_batch_results(client, batch, retry_policy)
+    if manifest is not None:
+        manifest.mark(path, 'batch', batch_id=batch_id, custom_ids=sorted(requests), done=True)
+
+    for custom_id, error in errors.items():
+        print(f"batch request {custom_id} failed: {error}")
+    return responses
@@ -0,0 +1,46 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STATEMENTS = [
+    'import cot',
+    'from cot import parse_gpt_response, run_generated_simulation',
+    'import cot; cot.get_templates()',
+    'import cot; cot.get_train_annotated()',
+]
+
+
+def time_statement(statement, repeats):
+    # a fresh interpreter per run, so nothing is already in sys.modules
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=REPO_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+# Wall time of importing cot in a new process, against a bare interpreter start as the baseline.
+# The first two statements are what a worker or a test pays; the others show the cost that is now
+# deferred until the templates or the dataset are actually used.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark how long it takes to import cot.py")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_statement('pass', args.repeats))
+    print(f"{'interpreter start':64s} {baseline * 1000:8.1f} ms")
+    for statement in STATEMENTS:
+        timings = time_statement(statement, args.repeats)
+        median = statistics.median(timings)
+        print(f"{statement:64s} {median * 1000:8.1f} ms  (+{(median - baseline) * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
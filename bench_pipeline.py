@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def check_simulations():
+    # The replayed scripts may fail where the recorded ones did, but never because the scratch
+    # directory lacks the simulation_utils.py they import
+    missing = []
+    for path in glob.glob('simscripts/std_err_*.txt'):
+        with open(path, 'r', encoding='utf-8') as f:
+            if re.search(r"No module named 'simulation_utils'", f.read()):
+                missing.append(os.path.basename(path))
+    assert not missing, f"{len(missing)} simulations could not import simulation_utils, e.g. {missing[0]}"
+
+
+# End-to-end throughput of gen_and_run_sims against the offline replay backend. Each run happens in a
+# scratch directory (cot.py writes gpt_results/, simscripts/ etc. relative to the working directory),
+# so the benchmark never touches the recorded results in the repository.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gen_and_run_sims offline against recorded responses")
+    parser.add_argument('--claims', type=int, default=100, help="number of dataset rows to run")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--latency', default='lognormal:1.5:0.5',
+                        help="simulated API latency: none, fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    for name in ['simulation_utils.py', 'bacteria.py', 'data', 'gpt_results.zip', 'gpt_ver_results.zip']:
+        os.symlink(os.path.join(REPO_DIR, name), os.path.join(workdir, name))
+    # the generated scripts import simulation_utils from their own directory
+    os.makedirs(os.path.join(workdir, 'simscripts'))
+    os.symlink(os.path.join(REPO_DIR, 'simulation_utils.py'), os.path.join(workdir, 'simscripts', 'simulation_utils.py'))
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    import cot
+    from llm_backend import make_backend
+    from pipeline_config import PipelineConfig
+
+    cot.train_annotated = cot.get_train_annotated().head(args.claims)
+
+    print(f"{args.claims} claims, latency {args.latency}, scratch dir {workdir}")
+    for concurrency in args.concurrency:
+        # no response or execution cache, so every level does the same work, and no rate limiting or
+        # telemetry; a config per level, so its counters cover that level alone
+        config = PipelineConfig()
+        config.rate_limiter = None
+        cot.use_backend(make_backend('replay', latency=args.latency, seed=args.seed))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            asyncio.run(cot.gen_and_run_sims(config, concurrency))
+        elapsed = time.perf_counter() - start
+        check_simulations()
+        responder = cot.backend.server.responder
+        cot.backend.close()
+        print(f"concurrency {concurrency:3d}: {elapsed:7.1f}s, {args.claims / elapsed:6.2f} claims/s "
+              f"(replayed {responder.hits}, missing {responder.misses})")
+
+
+if __name__ == '__main__':
+    main()
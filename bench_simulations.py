@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+from simulation_corpus import simulation_scripts
+from simulation_pool import SimulationPool
+from simulation_runner import run_simulation
+
+
+def run_corpus(run, scripts, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(run, scripts))
+    return time.perf_counter() - start, results
+
+
+# Wall time of executing the simulation corpus with a cold `python script.py` per script against
+# the pre-forked pool, plus a check that both give every script the same exit code and output.
+# Scripts run from a scratch directory so files they write don't land in the repository.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold simulation launches against SimulationPool")
+    parser.add_argument('--scripts', default=os.path.join(REPO_DIR, 'simscripts'), help="directory of simulation_{id}.py files")
+    parser.add_argument('--limit', type=int, default=None, help="only run the first N scripts")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    scripts = sorted(simulation_scripts(os.path.abspath(args.scripts)))[:args.limit]
+    os.chdir(tempfile.mkdtemp(prefix='bench_simulations_'))
+    print(f"{len(scripts)} scripts, {args.workers} workers, scratch dir {os.getcwd()}")
+
+    cold_time, cold = run_corpus(lambda script: run_simulation(script, args.timeout), scripts, args.workers)
+    print(f"{'cold interpreter per script':32s} {cold_time:7.2f}s  {cold_time / len(scripts) * 1000:7.1f} ms/script")
+
+    pool = SimulationPool(args.scripts)
+    try:
+        pool.run(scripts[0], args.timeout)
+        pool_time, pooled = run_corpus(lambda script: pool.run(script, args.timeout), scripts, args.workers)
+    finally:
+        pool.close()
+    print(f"{'pre-forked pool':32s} {pool_time:7.2f}s  {pool_time / len(scripts) * 1000:7.1f} ms/script  ({cold_time / pool_time:.1f}x)")
+
+    differing = [os.path.basename(script) for script, a, b in zip(scripts, cold, pooled)
+                 if (a.exit_code, a.std_out, a.std_err) != (b.exit_code, b.std_out, b.std_err)]
+    print(f"{len(differing)} scripts with different results" + (f": {', '.join(differing[:10])}" if differing else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import shutil
+
+
+# files written per claim; duplicates get copies of their canonical claim's files
+ARTIFACTS = [
+    ('gpt_results', 'prompt_{}.txt'),
+    ('gpt_results', 'response_{}.txt'),
+    ('simscripts', 'simulation_{}.py'),
+    ('simscripts', 'std_out_{}.txt'),
+    ('simscripts', 'std_err_{}.txt'),
+    ('gpt_ver_results', 'prompt_{}.txt'),
+    ('gpt_ver_results', 'response_{}.txt'),
+    ('gpt_ver_results', 'verdict_{}.json'),
+]
+
+
+def evidence_doc_ids(row):
+    # data_filter.py writes one row per cited document that has evidence, in cited_doc_ids order
+    return [doc_id for doc_id in row['cited_doc_ids'] if str(doc_id) in row['evidence']]
+
+
+def with_doc_ids(claims):
+    # Copy of the dataset with a doc_id column: the k-th row of an id is its k-th cited document with evidence
+    claims = claims.copy()
+    positions = claims.groupby('id').cumcount()
+    claims['doc_id'] = [evidence_doc_ids(row)[k] for (_, row), k in zip(claims.iterrows(), positions)]
+    return claims
+
+
+def artifact_id(id, doc_id):
+    return f"{id}_{doc_id}"
+
+
+def content_key(row):
+    # rows with the same claim, abstract and evidence would send identical generation prompts
+    payload = [row['claim'], row['abstract'], list(row['gold_evidence'])]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class ClaimPlan():
+    # The dataset reduced to the work worth doing. `claims` holds (artifact_id, row) for every
+    # distinct (id, doc_id) whose content has not been seen before; `duplicates` maps each remaining
+    # artifact id to the artifact id whose results it shares.
+    def __init__(self, dataset):
+        self.claims = []
+        self.duplicates = {}
+        self.rows = len(dataset)
+
+        canonical = {}
+        for _, row in with_doc_ids(dataset).iterrows():
+            key = artifact_id(row['id'], row['doc_id'])
+            content = content_key(row)
+            if key in canonical.values() or key in self.duplicates:
+                continue
+            if content in canonical:
+                self.duplicates[key] = canonical[content]
+            else:
+                canonical[content] = key
+                self.claims.append((key, row))
+
+    def summary(self):
+        return {'rows': self.rows, 'unique': len(self.claims), 'duplicates': len(self.duplicates)}
+
+    # Give every duplicate the files of the claim it was folded into
+    def link_artifacts(self):
+        for key, source in self.duplicates.items():
+            for directory, pattern in ARTIFACTS:
+                source_path = os.path.join(directory, pattern.format(source))
+                if os.path.exists(source_path):
+                    shutil.copyfile(source_path, os.path.join(directory, pattern.format(key)))
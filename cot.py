@@ -1,24 +1,86 @@
 import os
-import openai
-import pandas as pd
+import argparse
+import json
+import asyncio
+import functools
+import time
 import re
+import shutil
 from ast import literal_eval
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 
-client = openai.OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-print("openai authenticated")
+# openai, pandas and tqdm are imported where they are first needed, so worker processes and
+# tests that only use parse_gpt_response or run_generated_simulation import this module quickly
+from llm_cache import ResponseCache
+from run_manifest import RunManifest
+from rate_limiter import RateLimiter, count_tokens, estimate_prompt_tokens
+from retry_policy import RetryPolicy
+from batch_api import run_batch
+from telemetry import Telemetry
+from streaming import CodeBlockStream
+from verification_batching import BATCH_VERIFICATION_RESPONSE_FORMAT, VerificationBatcher, make_batch_verification_prompt, parse_batch_verification
+from verification_results import VERIFICATION_RESPONSE_FORMAT, parse_verification, save_verification
+from prompt_compaction import strip_code_comments, trim_abstract
+from claim_planning import ClaimPlan
+from verdict_extraction import extract_verdict
+from simulation_preflight import PREFLIGHT_HEADER, preflight
+from simulation_repair import apply_repair, make_repair_prompt, simulation_failed, trim_traceback
+from sample_voting import MajorityVote
+from simulation_runner import Cancellation, limit_status, run_simulation, stopped_by_limit
+from simulation_pool import SimulationPool
+from execution_cache import ExecutionCache
+from model_cascade import CascadeLog, cascade_order
+from pipeline_config import PipelineConfig
 
-with open('simulation_utils.py', 'r') as f:
-    simulation_template = f.read()
+# every model call goes through the backend's clients, created on first use; see get_backend and use_backend
+backend = None
 
-with open('bacteria.py', 'r') as f:
-    example_bacteria = f.read()
+# Every stage takes the run's PipelineConfig, which main() builds from the flags. Called without one,
+# e.g. run_generated_simulation from a worker, a stage gets this: no caches, telemetry or pool, so it
+# writes nothing to the working directory beyond its own result files and always runs the simulation.
+default_config = PipelineConfig()
 
+# loaded on first use by get_templates and get_train_annotated
+simulation_template = None
+example_bacteria = None
+train_annotated = None
 
-def get_gpt_response(id, claim, reference_text, gold_evidence, model="gpt-4o-mini", **kwargs):
 
-    if not os.path.exists('gpt_results/'):
-        os.makedirs('gpt_results/')
+def get_backend():
+    global backend
+    if backend is None:
+        from llm_backend import OpenAIBackend
+        backend = OpenAIBackend()
+        print("openai authenticated")
+    return backend
+
+
+def use_backend(new_backend):
+    global backend
+    backend = new_backend
+
+
+def get_templates():
+    global simulation_template, example_bacteria
+    if simulation_template is None:
+        with open('simulation_utils.py', 'r') as f:
+            simulation_template = f.read()
+
+        with open('bacteria.py', 'r') as f:
+            example_bacteria = f.read()
+    return simulation_template, example_bacteria
+
+
+def get_train_annotated():
+    global train_annotated
+    if train_annotated is None:
+        import pandas as pd
+        train_annotated = pd.read_json('data/data/processed_data/extended_train_annotated.jsonl', lines=True)
+    return train_annotated
+
+
+def make_generation_prompt(claim, reference_text, gold_evidence, templates=None):
+    base_template, bacteria_example = templates or get_templates()
 
     system_prompt = """
         You are a scientific claim inspector, who can catch fake claims accurately and verify correct claims efficiently.
@@ -44,18 +106,15 @@ def get_gpt_response(id, claim, reference_text, gold_evidence, model="gpt-4o-min
         ```
     """
 
+    # The templates and rules are identical for every claim and come first, so consecutive requests
+    # share a long byte-identical prefix the provider can cache; the claim-specific text goes last.
     user_prompt = f"""
-        Claim: {claim}
-        Reference Text: {reference_text}
-
-        Gold Sentence that can provide the evidence of claim verification: {''.join(gold_evidence)}
-        
         ```
         # simulation_utils.py
-        {simulation_template}
+        {base_template}
 
         # bacteria simulation example
-        {example_bacteria}
+        {bacteria_example}
         ```
 
         Rules for the output:
@@ -69,9 +128,58 @@ def get_gpt_response(id, claim, reference_text, gold_evidence, model="gpt-4o-min
         4. Make sure the output of the simulation is appropriate to the given instructions. 
         5. It clearly determines/shows if the  claim is supported or refuted.
 
+        Claim: {claim}
+        Reference Text: {reference_text}
+
+        Gold Sentence that can provide the evidence of claim verification: {''.join(gold_evidence)}
+
         Please generate your simulation now
     """
 
+    return system_prompt, user_prompt
+
+
+def prompt_tokens(system_prompt, user_prompt):
+    return estimate_prompt_tokens([{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}])
+
+
+def make_claim_prompt(config, id, claim, reference_text, gold_evidence):
+    # Generation prompt for one claim, compacted to config.prompt_budget tokens when a budget is set:
+    # the templates lose their comments and blank lines, then abstract sentences farthest from the
+    # gold evidence are dropped until the prompt fits.
+    if config.prompt_budget is None:
+        return make_generation_prompt(claim, reference_text, gold_evidence)
+
+    if config.compacted_templates is None:
+        config.compacted_templates = tuple(strip_code_comments(template) for template in get_templates())
+
+    original_tokens = prompt_tokens(*make_generation_prompt(claim, reference_text, gold_evidence))
+    system_prompt, user_prompt = make_generation_prompt(claim, reference_text, gold_evidence, config.compacted_templates)
+
+    dropped_sentences = 0
+    overflow = prompt_tokens(system_prompt, user_prompt) - config.prompt_budget
+    if overflow > 0:
+        abstract_budget = max(0, count_tokens(reference_text) - overflow)
+        reference_text, dropped_sentences = trim_abstract(reference_text, gold_evidence, abstract_budget, count_tokens)
+        system_prompt, user_prompt = make_generation_prompt(claim, reference_text, gold_evidence, config.compacted_templates)
+    compacted_tokens = prompt_tokens(system_prompt, user_prompt)
+
+    compaction = config.stats.compaction
+    compaction['claims'] += 1
+    compaction['original_tokens'] += original_tokens
+    compaction['compacted_tokens'] += compacted_tokens
+
+    if not os.path.exists('gpt_results/'):
+        os.makedirs('gpt_results/')
+    with open('gpt_results/compaction_report.jsonl', 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'id': id, 'original_tokens': original_tokens, 'compacted_tokens': compacted_tokens,
+                            'saved_tokens': original_tokens - compacted_tokens,
+                            'dropped_sentences': dropped_sentences}) + '\n')
+
+    return system_prompt, user_prompt
+
+
+def make_completion_kwargs(system_prompt, user_prompt, model, kwargs):
     messages=[{"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}]
 
@@ -79,25 +187,151 @@ def get_gpt_response(id, claim, reference_text, gold_evidence, model="gpt-4o-min
     kwargs["top_p"] = 1
     kwargs["frequency_penalty"] = 0.0
     kwargs["presence_penalty"] = 0.0
-    kwargs["timeout"] = 4*10*60  # 40 minutes
+    kwargs["timeout"] = 2*60  # 2 minutes per attempt, retry_policy retries timeouts
     kwargs["model"] = model
     kwargs["messages"] = messages
-    
 
-    response = client.chat.completions.create(**kwargs)
+    return kwargs
 
-    with open(f'gpt_results/prompt_{id}.txt', 'w', encoding='utf-8') as f:
+
+def record_prompt_cache_usage(config, response):
+    # prompt tokens the provider served from its prompt cache, over every API response received
+    usage = response.usage
+    if usage is None:
+        return
+    details = usage.prompt_tokens_details
+    config.stats.prompt_cache['prompt_tokens'] += usage.prompt_tokens
+    config.stats.prompt_cache['cached_tokens'] += (details.cached_tokens or 0) if details is not None else 0
+
+
+def record_telemetry(config, id, stage, wall_time, status='ok', **fields):
+    if config.telemetry is not None:
+        config.telemetry.record(id, stage, wall_time, status, **fields)
+
+
+async def call_api(config, kwargs):
+    import openai
+
+    rate_limiter = config.rate_limiter
+    if rate_limiter is None:
+        return await get_backend().async_client.chat.completions.create(**kwargs)
+
+    estimate = await rate_limiter.acquire(kwargs)
+    try:
+        raw = await get_backend().async_client.chat.completions.with_raw_response.create(**kwargs)
+    except openai.APIStatusError as e:
+        # 429s carry the same headers, and they matter most
+        rate_limiter.update_from_headers(e.response.headers)
+        raise
+    response = raw.parse()
+    rate_limiter.update_from_headers(raw.headers)
+    rate_limiter.reconcile(estimate, response.usage)
+    return response
+
+
+async def call_api_streaming(config, kwargs, stats=None):
+    # Stream the completion and hang up as soon as the simulation's code block is closed; stats['stopped_early']
+    # says whether it was, i.e. whether the prose the model would have written after the code went unpaid
+    import openai
+
+    rate_limiter = config.rate_limiter
+    kwargs = dict(kwargs, stream_options={'include_usage': True})
+    estimate = await rate_limiter.acquire(kwargs) if rate_limiter is not None else None
+    try:
+        raw = await get_backend().async_client.chat.completions.with_raw_response.create(**kwargs)
+    except openai.APIStatusError as e:
+        if rate_limiter is not None:
+            rate_limiter.update_from_headers(e.response.headers)
+        raise
+
+    stream = raw.parse()
+    code_stream = CodeBlockStream()
+    try:
+        async for chunk in stream:
+            if code_stream.feed(chunk):
+                break
+    finally:
+        await stream.close()
+
+    response = code_stream.completion(kwargs, count_tokens, estimate_prompt_tokens)
+    if stats is not None:
+        stats['stopped_early'] = code_stream.stopped_early
+    if rate_limiter is not None:
+        rate_limiter.update_from_headers(raw.headers)
+        rate_limiter.reconcile(estimate, response.usage)
+    return response
+
+
+async def create_completion(config, kwargs, id=None, stage=None):
+    import openai
+
+    start = time.perf_counter()
+    if config.response_cache is not None:
+        response = config.response_cache.get(kwargs)
+        if response is not None:
+            record_telemetry(config, id, stage, time.perf_counter() - start, 'cache_hit', model=kwargs['model'])
+            return response
+
+    stats = {'retries': 0}
+    if kwargs.get('stream'):
+        fn = functools.partial(call_api_streaming, config, stats=stats)
+    else:
+        fn = functools.partial(call_api, config)
+    try:
+        if config.retry_policy is None:
+            response = await fn(kwargs)
+        else:
+            response = await config.retry_policy.acall(fn, kwargs, stats)
+    except openai.APIError as e:
+        record_telemetry(config, id, stage, time.perf_counter() - start, type(e).__name__, model=kwargs['model'], retries=stats['retries'])
+        raise
+    record_telemetry(config, id, stage, time.perf_counter() - start, model=response.model, usage=response.usage, **stats)
+
+    record_prompt_cache_usage(config, response)
+    if config.response_cache is not None:
+        config.response_cache.put(kwargs, response)
+    return response
+
+
+def message_text(message):
+    # a refusal under the strict response_format has no content; its explanation is saved in its place,
+    # so the reply still parses, as a None verdict
+    return (message.content or getattr(message, 'refusal', None) or '').strip()
+
+
+def save_gpt_response(results_dir, id, user_prompt, response):
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+
+    with open(f'{results_dir}/prompt_{id}.txt', 'w', encoding='utf-8') as f:
         f.write(user_prompt)
 
-    with open(f'gpt_results/response_{id}.txt', 'w', encoding='utf-8') as f:
-        f.write(response.choices[0].message.content.strip())
-    
+    content = message_text(response.choices[0].message)
+    with open(f'{results_dir}/response_{id}.txt', 'w', encoding='utf-8') as f:
+        f.write(content)
+
+    return content
+
+
+async def get_gpt_response(config, id, claim, reference_text, gold_evidence, model=None, **kwargs):
+    model = model or config.generation_models[0]
+    system_prompt, user_prompt = make_claim_prompt(config, id, claim, reference_text, gold_evidence)
+    if config.stream_generation:
+        kwargs["stream"] = True
+    kwargs["extra_headers"] = {"X-Claim-Id": str(id)}
+    kwargs = make_completion_kwargs(system_prompt, user_prompt, model, kwargs)
+
+    response = await create_completion(config, kwargs, id, 'generate')
+    content = save_gpt_response('gpt_results', id, user_prompt, response)
+
     print(f"Responses saved to gpt_results/response_{id}")
 
-    return response.choices[0].message.content.strip()
+    return content
 
 
-def parse_gpt_response(id, response):
+def parse_gpt_response(id, response, config=None):
+    config = config or default_config
+    start = time.perf_counter()
     if not os.path.exists('simscripts/'):
         os.makedirs('simscripts/')
 
@@ -110,35 +344,133 @@ def parse_gpt_response(id, response):
         f.write(code_block)
     
     print(f"simscripts/simulation_{id}.py")
+    record_telemetry(config, id, 'parse', time.perf_counter() - start, 'ok' if code_block.strip() else 'no_code')
 
     return code_block, code_filepath
 
-def run_generated_simulation(id, code_filepath):
+
+def preflight_simulation(id, code_filepath, config=None):
+    # Adds the imports the script is missing in place, and reports what would still fail at runtime
+    config = config or default_config
+    start = time.perf_counter()
+    with open(code_filepath, 'r', encoding='utf-8') as f:
+        report = preflight(f.read())
+    if report.added_imports:
+        with open(code_filepath, 'w', encoding='utf-8') as f:
+            f.write(report.code)
+        print(f"{code_filepath}: added {', '.join(report.added_imports)}")
+    record_telemetry(config, id, 'preflight', time.perf_counter() - start, 'ok' if report.ok else 'failed',
+                     added_imports=len(report.added_imports), errors=len(report.errors))
+    return report
+
+
+def run_generated_simulation(id, code_filepath, config=None, cancellation=None):
+    # Pre-flights and runs a simulation under the config's limits, through its pool and execution cache if it has them.
+    # cancellation, a simulation_runner.Cancellation, lets another thread kill the run once it is no longer needed
+    config = config or default_config
 
     std_out = ""
     std_err = ""
 
     stdoutfile = 'simscripts/' + f"std_out_{id}.txt"
     stderrfile = 'simscripts/' + f"std_err_{id}.txt"
-    command = "python " + code_filepath + " > " + stdoutfile + " 2> " + stderrfile
 
-    print("Running command: " + command)
-    os.system(command)
+    report = preflight_simulation(id, code_filepath, config)
+    if not report.ok:
+        # a certain failure: skip the process spawn and record the pre-flight errors as its stderr
+        std_err = str(report)
+        with open(stdoutfile, "w") as f:
+            f.write(std_out)
+        with open(stderrfile, "w", encoding='utf-8') as f:
+            f.write(std_err)
+        print(f"{code_filepath} failed pre-flight: {report.errors[0]}")
+        return std_out, std_err
 
-    with open(stdoutfile, "r") as f:
-        std_out = f.read()
-    with open(stderrfile, "r") as f:
-        std_err = f.read()
+    print(f"Running {code_filepath}")
+    run = config.simulation_pool.run if config.simulation_pool is not None else run_simulation
+    limits = (config.simulation_timeout, config.max_output_bytes, config.simulation_cpu_seconds, config.simulation_memory_mb)
+    start = time.perf_counter()
+    if config.execution_cache is not None:
+        result = config.execution_cache.run(run, code_filepath, *limits, cancellation)
+    else:
+        result = run(code_filepath, *limits, cancellation)
+    record_telemetry(config, id, 'execute', time.perf_counter() - start, result.status, exit_code=result.exit_code, limit=result.exceeded,
+                     peak_rss_mb=result.peak_rss_mb, cached=result.cached)
+    if result.cached:
+        print(f"{code_filepath}: unchanged since it last ran, reusing its output")
+    if result.cancelled:
+        print(f"{code_filepath}: cancelled, its result is no longer needed")
+    if result.timed_out or result.exceeded is not None:
+        print(f"{code_filepath}: {stopped_by_limit(result.std_err)}")
+
+    std_out, std_err = result.std_out, result.std_err
+    with open(stdoutfile, "w", encoding='utf-8') as f:
+        f.write(std_out)
+    with open(stderrfile, "w", encoding='utf-8') as f:
+        f.write(std_err)
 
-        
     return std_out, std_err
 
 
-def get_gpt_verification(id, sim_output, claim, model="gpt-4o-mini", **kwargs):
+def make_repair_kwargs(config, id, claim, code, std_err, spent, model=None):
+    # None when the next repair does not fit in what is left of the claim's token budget
+    model = model or config.generation_models[0]
+    system_prompt, user_prompt = make_repair_prompt(claim, code, trim_traceback(std_err))
+    kwargs = make_completion_kwargs(system_prompt, user_prompt, model, {"extra_headers": {"X-Claim-Id": str(id)}})
+    remaining = config.repair_budget - spent - prompt_tokens(system_prompt, user_prompt)
+    if remaining < 256:
+        return None
+    kwargs["max_tokens"] = remaining
+    return kwargs
+
+
+def apply_repair_response(config, id, attempt, code, code_filepath, kwargs, response):
+    # Writes the patched script and returns True, or returns False if the reply holds no usable patch
+    config.stats.repairs['attempts'] += 1
+    config.stats.repairs['tokens'] += response.usage.total_tokens
+    content = save_gpt_response('gpt_repairs', f'{id}_{attempt}', kwargs['messages'][-1]['content'], response)
+    patched = apply_repair(code, content)
+    if patched is None or patched == code:
+        print(f"{code_filepath}: repair {attempt} did not apply")
+        return False
+
+    with open(code_filepath, 'w', encoding='utf-8') as f:
+        f.write(patched)
+    print(f"{code_filepath}: applied repair {attempt}, see gpt_repairs/response_{id}_{attempt}.txt")
+    return True
+
+
+async def repair_simulation(config, id, claim, code_filepath, std_out, std_err, executor, model=None):
+    # A failed simulation is sent back to the model with its traceback for a minimal patch and re-run,
+    # at most config.repair_attempts times and within config.repair_budget tokens for the claim
+    if config.repair_attempts <= 0 or not simulation_failed(std_err):
+        return std_out, std_err
+
+    config.stats.repairs['claims'] += 1
+    spent = 0
+    loop = asyncio.get_running_loop()
+    for attempt in range(1, config.repair_attempts + 1):
+        with open(code_filepath, 'r', encoding='utf-8') as f:
+            code = f.read()
+        kwargs = make_repair_kwargs(config, id, claim, code, std_err, spent, model)
+        if kwargs is None:
+            print(f"{code_filepath}: repair budget of {config.repair_budget} tokens used up")
+            break
+        response = await create_completion(config, kwargs, id, 'repair')
+        spent += response.usage.total_tokens
+        # temperature is 0, so a patch that doesn't apply would come back the same on a retry
+        if not apply_repair_response(config, id, attempt, code, code_filepath, kwargs, response):
+            break
 
-    if not os.path.exists('gpt_ver_results/'):
-        os.makedirs('gpt_ver_results/')
+        std_out, std_err = await loop.run_in_executor(executor, run_generated_simulation, id, code_filepath, config)
+        if not simulation_failed(std_err):
+            config.stats.repairs['repaired'] += 1
+            break
 
+    return std_out, std_err
+
+
+def make_verification_prompt(claim, sim_output):
     system_prompt = """
         You are a scientific claim inspector, who can catch fake claims accurately and verify correct claims efficiently.
         Your main responsibility is to look at the output of a simulation. 
@@ -150,11 +482,11 @@ def get_gpt_verification(id, sim_output, claim, model="gpt-4o-mini", **kwargs):
         1. A Claim
         2. The output of a Simulation that can be used to help verify the claim.
         
-        Your output will be a python dictionary containing the following information:
+        Your output will be a JSON object containing the following information:
         {
             "claim": the given claim as it is,
-            "verification_result": "Supported" or "Refuted" or None if you are unable to verify the claim,
-            "reason": reason of the verification result, or reason of the None output
+            "verification_result": "Supported" or "Refuted" or null if you are unable to verify the claim,
+            "reason": reason of the verification result, or reason of the null output
         }
         
     """
@@ -166,54 +498,113 @@ def get_gpt_verification(id, sim_output, claim, model="gpt-4o-mini", **kwargs):
 
         Rules for the output:
         1. Make sure the output of the simulation is appropriate to the given instructions.
-        2. If your verification_result is None, make sure to include the reason as to why you were note able to determine the result
-        3. Your verification result should only include None if the simulation output is an execution error, otherwise you should provide a definite result and a definite reason.
+        2. If your verification_result is null, make sure to include the reason as to why you were note able to determine the result
+        3. Your verification result should only be null if the simulation output is an execution error, otherwise you should provide a definite result and a definite reason.
 
         Please generate your verification result now
     """
 
-    messages=[{"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}]
+    return system_prompt, user_prompt
 
-    kwargs["temperature"] = 0.0
-    kwargs["top_p"] = 1
-    kwargs["frequency_penalty"] = 0.0
-    kwargs["presence_penalty"] = 0.0
-    kwargs["timeout"] = 4*10*60  # 40 minutes
-    kwargs["model"] = model
-    kwargs["messages"] = messages
-    
-
-    response = client.chat.completions.create(**kwargs)
 
-    with open(f'gpt_ver_results/prompt_{id}.txt', 'w', encoding='utf-8') as f:
-        f.write(user_prompt)
+async def get_gpt_verification(config, id, sim_output, claim, model=None, **kwargs):
+    model = model or config.verification_model
+    system_prompt, user_prompt = make_verification_prompt(claim, sim_output)
+    kwargs["response_format"] = VERIFICATION_RESPONSE_FORMAT
+    kwargs["extra_headers"] = {"X-Claim-Id": str(id)}
+    kwargs = make_completion_kwargs(system_prompt, user_prompt, model, kwargs)
 
-    with open(f'gpt_ver_results/response_{id}.txt', 'w', encoding='utf-8') as f:
-        f.write(response.choices[0].message.content.strip())
+    response = await create_completion(config, kwargs, id, 'verify')
+    content = message_text(response.choices[0].message)
+    save_verification('gpt_ver_results', id, parse_verification(content, claim), content, user_prompt)
 
-    
     print(f"gpt_ver_results/response_{id}.txt")
 
-    return response.choices[0].message.content.strip()
+    return content
+
+
+def with_simulation_status(verdict, std_err):
+    # The verdict of a simulation stopped by one of its limits records how it was stopped, whichever
+    # verifier decided it; evaluation.py reports these verdicts as stopped_by_limits
+    status = limit_status(std_err)
+    if status is not None:
+        verdict['simulation_status'] = status
+    return verdict
+
+
+def local_verification(config, id, claim, std_out, std_err):
+    # Saves and returns the verdict read from the simulation output, in the same dictionary form as
+    # an LLM verification, or returns None when the output is ambiguous or errored and the LLM must decide
+    if not config.local_verdicts:
+        return None
+    if std_err.startswith(PREFLIGHT_HEADER):
+        verification_result, reason = None, f"The simulation could not run. {std_err}"
+    elif stopped_by_limit(std_err) is not None:
+        # whatever it printed before it was stopped is incomplete
+        line = stopped_by_limit(std_err)
+        verification_result, reason = None, f"The simulation did not finish. {line}"
+    else:
+        verdict = extract_verdict(std_out, std_err, claim)
+        if verdict is None:
+            config.stats.verifications['llm'] += 1
+            return None
+        verification_result, line = verdict
+        reason = f"The simulation output states: {line}"
+
+    verdict = {'claim': claim, 'verification_result': verification_result, 'reason': reason}
+    content = save_verification('gpt_ver_results', id, with_simulation_status(verdict, std_err))
+
+    config.stats.verifications['local'] += 1
+    record_telemetry(config, id, 'verify', 0.0, 'local')
+    print(f"gpt_ver_results/response_{id}.txt (local verdict)")
+    return content
 
 
-train_annotated = pd.read_json('data/data/processed_data/extended_train_annotated.jsonl', lines=True)
+def save_batch_verification(items, user_prompt, verdicts):
+    # One response file per claim, in the same JSON form as a single verification reply
+    contents = []
+    for n, (id, claim, sim_output) in enumerate(items, start=1):
+        verdict = verdicts.get(f'c{n}')
+        if verdict is None:
+            contents.append(None)
+            continue
 
-def gen_and_run_sims():
-    # This part will take upto 2hrs and cost around $0.50 using OPEN_AI_KEY
-    for i, row in tqdm(train_annotated.iterrows()):
-        id = row['id']
-        claim = row['claim']
-        abstract = row['abstract']
-        gold_evidence = row['gold_evidence']
+        verdict = {'claim': claim, 'verification_result': verdict['verification_result'], 'reason': verdict.get('reason')}
+        contents.append(save_verification('gpt_ver_results', id, verdict, prompt=user_prompt))
 
-        response = get_gpt_response(id, claim, abstract, gold_evidence)
-        code_block, code_filepath = parse_gpt_response(id, response)
+    return contents
 
-        std_out, std_err = run_generated_simulation(id, code_filepath)
 
-        sim_output = f"""
+async def get_gpt_verification_batch(config, items, model=None, **kwargs):
+    model = model or config.verification_model
+    # Verify several (id, claim, sim_output) items in one request; items the reply doesn't
+    # cover (or every item, if the reply is malformed) fall back to single-claim verification
+    system_prompt, user_prompt = make_batch_verification_prompt([(claim, sim_output) for _, claim, sim_output in items])
+    kwargs["response_format"] = BATCH_VERIFICATION_RESPONSE_FORMAT
+    kwargs["extra_headers"] = {"X-Claim-Ids": ','.join(str(id) for id, _, _ in items)}
+    kwargs = make_completion_kwargs(system_prompt, user_prompt, model, kwargs)
+
+    response = await create_completion(config, kwargs, None, 'verify_batch')
+    try:
+        verdicts = parse_batch_verification(message_text(response.choices[0].message), len(items))
+    except (ValueError, TypeError) as e:
+        print(f"falling back to single-claim verification: {e}")
+        verdicts = {}
+
+    contents = save_batch_verification(items, user_prompt, verdicts)
+    fallbacks = [n for n in range(len(items)) if contents[n] is None]
+    results = await asyncio.gather(*(get_gpt_verification(config, items[n][0], items[n][2], items[n][1], model) for n in fallbacks))
+    for n, content in zip(fallbacks, results):
+        contents[n] = content
+    for n, (id, _, _) in enumerate(items):
+        if n not in fallbacks:
+            print(f"gpt_ver_results/response_{id}.txt")
+
+    return contents
+
+
+def format_sim_output(std_out, std_err):
+    return f"""
                 Simulation Output:
                 {std_out}
 
@@ -221,8 +612,539 @@ def gen_and_run_sims():
                 {std_err}
             """
 
-        response = get_gpt_verification(id, sim_output, claim)
+
+def save_candidates(id, user_prompt, response):
+    if not os.path.exists('gpt_results/'):
+        os.makedirs('gpt_results/')
+    with open(f'gpt_results/prompt_{id}.txt', 'w', encoding='utf-8') as f:
+        f.write(user_prompt)
+
+    contents = []
+    for k, choice in enumerate(response.choices):
+        content = message_text(choice.message)
+        with open(f'gpt_results/response_{id}_s{k}.txt', 'w', encoding='utf-8') as f:
+            f.write(content)
+        contents.append(content)
+    print(f"{len(contents)} candidates saved to gpt_results/response_{id}_s*.txt")
+    return contents
+
+
+def make_sampling_kwargs(config, id, claim, reference_text, gold_evidence, model=None):
+    model = model or config.generation_models[0]
+    # one request for every candidate, so the prompt tokens are paid once
+    system_prompt, user_prompt = make_claim_prompt(config, id, claim, reference_text, gold_evidence)
+    kwargs = make_completion_kwargs(system_prompt, user_prompt, model, {"n": config.samples, "extra_headers": {"X-Claim-Id": str(id)}})
+    kwargs["temperature"] = config.sample_temperature
+    return kwargs, user_prompt
+
+
+def run_candidate(config, id, k, claim, response, cancellation):
+    # Runs candidate k of a claim; returns its outputs and its local verdict (None if it failed or is ambiguous),
+    # or None if the claim's vote was decided before the candidate finished
+    if cancellation.cancelled:
+        return None
+    candidate_id = f'{id}_s{k}'
+    code_block, code_filepath = parse_gpt_response(candidate_id, response, config)
+    std_out, std_err = run_generated_simulation(candidate_id, code_filepath, config, cancellation)
+    if cancellation.cancelled:
+        return None
+    config.stats.samples['executed'] += 1
+    # a candidate stopped by a limit abstains, even if it printed a verdict before it was stopped
+    verdict = extract_verdict(std_out, std_err, claim) if config.local_verdicts and stopped_by_limit(std_err) is None else None
+    return std_out, std_err, verdict[0] if verdict is not None else None
+
+
+def finish_vote(id, claim, vote, outputs):
+    # Copies the winning candidate's files to the claim's own names and saves the voted verdict
+    winner = vote.winner()
+    verification_result, k = winner if winner is not None else (None, min(outputs))
+    for directory, pattern in [('gpt_results', 'response_{}.txt'), ('simscripts', 'simulation_{}.py'),
+                               ('simscripts', 'std_out_{}.txt'), ('simscripts', 'std_err_{}.txt')]:
+        source = os.path.join(directory, pattern.format(f'{id}_s{k}'))
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(directory, pattern.format(id)))
+
+    if winner is None:
+        reason = f"None of the {vote.n} candidate simulations produced a verdict."
+    else:
+        reason = f"Majority vote over {vote.n} candidate simulations ({vote.summary()}); candidate {k} is kept."
+    verdict = {'claim': claim, 'verification_result': verification_result, 'reason': reason}
+    content = save_verification('gpt_ver_results', id, with_simulation_status(verdict, outputs[k][1]))
+    print(f"gpt_ver_results/response_{id}.txt ({reason})")
+    return content, outputs[k]
+
+
+async def run_claim_sampled(config, id, row, executor):
+    # Executes the candidates in parallel and stops as soon as local verdicts reach a majority; only if
+    # they don't are the candidates with ambiguous output sent to LLM verification, one at a time
+    claim = row['claim']
+    kwargs, user_prompt = make_sampling_kwargs(config, id, claim, row['abstract'], row['gold_evidence'])
+    responses = save_candidates(id, user_prompt, await create_completion(config, kwargs, id, 'generate'))
+    config.stats.samples['claims'] += 1
+    config.stats.samples['candidates'] += len(responses)
+
+    vote = MajorityVote(len(responses))
+    outputs = {}
+    ambiguous = []
+    loop = asyncio.get_running_loop()
+    cancellation = Cancellation()
+    pending = {loop.run_in_executor(executor, run_candidate, config, id, k, claim, response, cancellation): k
+               for k, response in enumerate(responses)}
+    try:
+        while pending and vote.decided is None:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                k = pending.pop(future)
+                std_out, std_err, verdict = future.result()
+                outputs[k] = (std_out, std_err)
+                if verdict is None and not simulation_failed(std_err):
+                    ambiguous.append(k)
+                else:
+                    vote.add(k, verdict)
+    finally:
+        # the losers still running are killed and those still queued return at once; waiting for them
+        # hands their executor threads back to the other claims
+        cancellation.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    for k in ambiguous:
+        if vote.decided is not None:
+            break
+        content = await get_gpt_verification(config, f'{id}_s{k}', format_sim_output(*outputs[k]), claim)
+        config.stats.samples['llm_verified'] += 1
+        vote.add(k, parse_verification(content, claim)['verification_result'])
+
+    return finish_vote(id, claim, vote, outputs)
+
+
+def generated_by(config, manifest, key):
+    # manifests written before the cascade don't record the model
+    return manifest.get(key, 'generate').get('model', config.generation_models[0])
+
+
+def verdict_shortfall(response, claim):
+    if parse_verification(response, claim)['verification_result'] is None:
+        return 'verification gave no verdict'
+    return None
+
+
+def cascade_decision(config, id, model, reason):
+    # Logs what happens to this model's attempt at the claim and returns True when the claim should
+    # be retried with the next model. reason says why the attempt fell short, None if it is accepted
+    cascade_log = config.cascade_log
+    if cascade_log is None:
+        return False
+    if reason is None:
+        cascade_log.record(id, model, 'accept')
+        return False
+    level = config.generation_models.index(model)
+    if level + 1 == len(config.generation_models):
+        cascade_log.record(id, model, 'exhausted', reason)
+        return False
+    cascade_log.record(id, model, 'escalate', reason, config.generation_models[level + 1])
+    return True
+
+
+def plan_claims():
+    plan = ClaimPlan(get_train_annotated())
+    print("claim plan:", plan.summary())
+    return plan
+
+
+async def run_claim(config, key, row, executor, manifest=None, verifier=None):
+    # key is the claim's artifact id ({id}_{doc_id}), used for its files and manifest entries.
+    # verifier defaults to one get_gpt_verification call per claim
+    verifier = verifier or functools.partial(get_gpt_verification, config)
+    id = key
+    claim = row['claim']
+    abstract = row['abstract']
+    gold_evidence = row['gold_evidence']
+
+    if manifest is not None and manifest.is_done(key, 'verify'):
+        return manifest.get(key, 'verify')['response']
+
+    if config.samples > 1:
+        response, (std_out, std_err) = await run_claim_sampled(config, id, row, executor)
+        if manifest is not None:
+            manifest.mark(key, 'execute', std_out=std_out, std_err=std_err)
+            manifest.mark(key, 'verify', response=response)
+        return response
+
+    models = config.generation_models
+    if manifest is not None and manifest.is_done(key, 'generate') and generated_by(config, manifest, key) in models:
+        # resume at the model the claim had escalated to; the models before it already fell short, and
+        # generating with them again would replace the manifest's generation by the stronger model
+        models = models[models.index(generated_by(config, manifest, key)):]
+    for model in models:
+        # what the manifest holds only stands for this attempt if the same model generated it
+        generated = manifest is not None and manifest.is_done(key, 'generate') and generated_by(config, manifest, key) == model
+        if generated:
+            response = manifest.get(key, 'generate')['response']
+        else:
+            response = await get_gpt_response(config, id, claim, abstract, gold_evidence, model)
+            if manifest is not None:
+                manifest.mark(key, 'generate', response=response, model=model)
+
+        if generated and manifest.is_done(key, 'parse'):
+            code_filepath = manifest.get(key, 'parse')['code_filepath']
+        else:
+            code_block, code_filepath = parse_gpt_response(id, response, config)
+            if manifest is not None:
+                manifest.mark(key, 'parse', code_filepath=code_filepath)
+
+        if generated and manifest.is_done(key, 'execute'):
+            std_out, std_err = manifest.get(key, 'execute')['std_out'], manifest.get(key, 'execute')['std_err']
+        else:
+            # the simulation is a blocking subprocess, so keep it off the event loop
+            loop = asyncio.get_running_loop()
+            std_out, std_err = await loop.run_in_executor(executor, run_generated_simulation, id, code_filepath, config)
+            std_out, std_err = await repair_simulation(config, id, claim, code_filepath, std_out, std_err, executor, model)
+            if manifest is not None:
+                manifest.mark(key, 'execute', std_out=std_out, std_err=std_err)
+
+        failed = simulation_failed(std_err)
+        if failed and cascade_decision(config, id, model, 'simulation failed'):
+            continue
+
+        response = local_verification(config, id, claim, std_out, std_err)
+        if response is None:
+            sim_output = format_sim_output(std_out, std_err)
+            response = await verifier(id, sim_output, claim)
+            if limit_status(std_err) is not None:
+                # the verifier only saw the output, so the stopped run's status is added to its verdict here
+                save_verification('gpt_ver_results', id, with_simulation_status(parse_verification(response, claim), std_err), response)
+
+        if not failed and cascade_decision(config, id, model, verdict_shortfall(response, claim)):
+            continue
+        if manifest is not None:
+            manifest.mark(key, 'verify', response=response)
+        return response
+
+
+async def gen_and_run_sims(config, concurrency=16, sim_workers=None, manifest=None, verify_batch_size=1):
+    # This part will take upto 2hrs and cost around $0.50 using OPEN_AI_KEY.
+    # Up to `concurrency` claims are in flight at once; 1 runs them one after the other.
+    import openai
+    from tqdm import tqdm
+
+    plan = plan_claims()
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=sim_workers or os.cpu_count())
+    progress = tqdm(total=len(plan.claims))
+    verifier = None
+    if verify_batch_size > 1:
+        batcher = VerificationBatcher(functools.partial(get_gpt_verification_batch, config), verify_batch_size)
+
+        async def verifier(id, sim_output, claim):
+            # a claim waiting for its batch gives up its slot, so the claims after it can fill the batch
+            semaphore.release()
+            try:
+                return await batcher.verify(id, sim_output, claim)
+            finally:
+                await semaphore.acquire()
+
+    async def run_one(key, row):
+        async with semaphore:
+            try:
+                await run_claim(config, key, row, executor, manifest, verifier)
+            except openai.APIError as e:
+                # retries are exhausted for this claim; the manifest leaves it unfinished for --resume
+                print(f"claim {key} failed: {type(e).__name__}: {e}")
+            progress.update(1)
+
+    try:
+        await asyncio.gather(*(run_one(key, row) for key, row in plan.claims))
+    finally:
+        progress.close()
+        executor.shutdown(wait=True)
+    plan.link_artifacts()
+
+
+def create_completions_batch(config, requests, path, stage, poll_interval=30, manifest=None):
+    # The batch counterpart of create_completion: key -> response for the requests (key -> kwargs) that
+    # the response cache answers, and for the rest, sent as one batch written to path
+    responses = {}
+    if config.response_cache is not None:
+        responses = {key: config.response_cache.get(kwargs) for key, kwargs in requests.items()}
+        responses = {key: response for key, response in responses.items() if response is not None}
+    batch_requests = {key: kwargs for key, kwargs in requests.items() if key not in responses}
+    batch_responses = run_batch(get_backend().client, path, batch_requests, poll_interval, config.retry_policy, manifest)
+    for key, response in batch_responses.items():
+        record_prompt_cache_usage(config, response)
+        record_telemetry(config, key, stage, None, model=response.model, usage=response.usage, batch=True)
+        if config.response_cache is not None:
+            config.response_cache.put(requests[key], response)
+    responses.update(batch_responses)
+    return responses
+
+
+def gen_and_run_sims_batch(config, manifest=None, batch_dir='gpt_batches', poll_interval=30, sim_workers=None):
+    # Full-dataset run through the Batch API: one batch for every generation request, local
+    # parse/execute, then one batch for every verification request. Requests already answered
+    # by the response cache or recorded in the manifest are left out of the batches.
+    plan = plan_claims()
+    rows = plan.claims
+
+    requests = {}
+    prompts = {}
+    for key, row in rows:
+        if manifest is not None and manifest.is_done(key, 'generate'):
+            continue
+        system_prompt, user_prompt = make_claim_prompt(config, key, row['claim'], row['abstract'], row['gold_evidence'])
+        requests[key] = make_completion_kwargs(system_prompt, user_prompt, config.generation_models[0], {})
+        prompts[key] = user_prompt
+
+    responses = create_completions_batch(config, requests, f'{batch_dir}/generation_requests.jsonl', 'generate', poll_interval, manifest)
+
+    generated = {}
+    for key, row in rows:
+        if manifest is not None and manifest.is_done(key, 'generate'):
+            generated[key] = manifest.get(key, 'generate')['response']
+        elif key in responses:
+            generated[key] = save_gpt_response('gpt_results', key, prompts[key], responses[key])
+            if manifest is not None:
+                manifest.mark(key, 'generate', response=generated[key])
+
+    claims = dict(rows)
+
+    async def execute(key, executor):
+        if manifest is not None and manifest.is_done(key, 'execute'):
+            execute = manifest.get(key, 'execute')
+            return execute['std_out'], execute['std_err']
+        if manifest is not None and manifest.is_done(key, 'parse'):
+            code_filepath = manifest.get(key, 'parse')['code_filepath']
+        else:
+            code_block, code_filepath = parse_gpt_response(key, generated[key], config)
+            if manifest is not None:
+                manifest.mark(key, 'parse', code_filepath=code_filepath)
+        loop = asyncio.get_running_loop()
+        std_out, std_err = await loop.run_in_executor(executor, run_generated_simulation, key, code_filepath, config)
+        std_out, std_err = await repair_simulation(config, key, claims[key]['claim'], code_filepath, std_out, std_err, executor)
+        if manifest is not None:
+            manifest.mark(key, 'execute', std_out=std_out, std_err=std_err)
+        return std_out, std_err
+
+    async def execute_all(keys):
+        # repairs are model calls, so the executions share the async driver's stages
+        with ThreadPoolExecutor(max_workers=sim_workers or os.cpu_count()) as executor:
+            return await asyncio.gather(*(execute(key, executor) for key in keys))
+
+    keys = [key for key, _ in rows if key in generated]
+    executed = dict(zip(keys, asyncio.run(execute_all(keys))))
+
+    requests = {}
+    prompts = {}
+    for key, row in rows:
+        if key not in executed or (manifest is not None and manifest.is_done(key, 'verify')):
+            continue
+        response = local_verification(config, key, row['claim'], *executed[key])
+        if response is not None:
+            if manifest is not None:
+                manifest.mark(key, 'verify', response=response)
+            continue
+        system_prompt, user_prompt = make_verification_prompt(row['claim'], format_sim_output(*executed[key]))
+        requests[key] = make_completion_kwargs(system_prompt, user_prompt, config.verification_model, {"response_format": VERIFICATION_RESPONSE_FORMAT})
+        prompts[key] = user_prompt
+
+    responses = create_completions_batch(config, requests, f'{batch_dir}/verification_requests.jsonl', 'verify', poll_interval, manifest)
+
+    for key, row in rows:
+        if key in responses:
+            response = message_text(responses[key].choices[0].message)
+            verdict = with_simulation_status(parse_verification(response, row['claim']), executed[key][1])
+            save_verification('gpt_ver_results', key, verdict, response, prompts[key])
+            if manifest is not None:
+                manifest.mark(key, 'verify', response=response)
+    plan.link_artifacts()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate, run and verify claim simulations")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="number of claims in flight at once (1 runs them one after the other)")
+    parser.add_argument('--sim-workers', type=int, default=None,
+                        help="threads used to execute simulations (defaults to the CPU count)")
+    parser.add_argument('--batch', action='store_true',
+                        help="send generation and verification through the OpenAI Batch API (half price, results within 24h)")
+    parser.add_argument('--batch-dir', default='gpt_batches',
+                        help="directory for the Batch API request files")
+    parser.add_argument('--poll-interval', type=float, default=30,
+                        help="seconds between batch status checks")
+    parser.add_argument('--base-url', default=None,
+                        help="OpenAI-compatible endpoint to use instead of api.openai.com (e.g. local_openai_server.py)")
+    parser.add_argument('--backend', choices=['openai', 'replay', 'canned'], default='openai',
+                        help="replay answers offline with the responses recorded in gpt_results.zip/gpt_ver_results.zip")
+    parser.add_argument('--latency', default='none',
+                        help="simulated latency of the offline backends: none, fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed of the simulated latency")
+    parser.add_argument('--verify-batch-size', type=int, default=1,
+                        help="claims packed into one verification request (1 verifies each claim on its own)")
+    parser.add_argument('--samples', type=int, default=1,
+                        help="candidate simulations per claim, drawn in one request and settled by majority vote")
+    parser.add_argument('--sample-temperature', type=float, default=0.7,
+                        help="sampling temperature of the candidates when --samples is above 1")
+    parser.add_argument('--models', nargs='+', default=['gpt-4o-mini'],
+                        help="generation models to cascade through, in the order given (list the cheapest first); a claim escalates to the next one when its simulation fails or gets no verdict")
+    parser.add_argument('--verification-model', default='gpt-4o-mini',
+                        help="model that verifies the simulation outputs")
+    parser.add_argument('--sim-timeout', type=float, default=60.0,
+                        help="seconds a simulation may run before it is killed and recorded as timed out")
+    parser.add_argument('--max-output-bytes', type=int, default=1_000_000,
+                        help="bytes of stdout and of stderr kept from each simulation, the rest is dropped")
+    parser.add_argument('--sim-cpu-seconds', type=float, default=30,
+                        help="CPU seconds a simulation may use before it is stopped (0 for no limit, POSIX only)")
+    parser.add_argument('--sim-memory-mb', type=int, default=1024,
+                        help="address space in MB a simulation may allocate (0 for no limit, POSIX only)")
+    parser.add_argument('--sim-pool', action='store_true',
+                        help="fork simulations from a server that has already imported simulation_utils instead of starting a new interpreter each (POSIX only)")
+    parser.add_argument('--repair-attempts', type=int, default=2,
+                        help="times a failed simulation is patched by the model and re-run (0 disables repair)")
+    parser.add_argument('--repair-budget', type=int, default=4000,
+                        help="tokens per claim that repair prompts and patches may use")
+    parser.add_argument('--no-local-verdicts', action='store_true',
+                        help="send every simulation output to the LLM, even when it states its verdict plainly")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream generation responses and stop reading once the simulation's code block is closed")
+    parser.add_argument('--compact', action='store_true',
+                        help="strip comments from the templates and trim abstracts to fit --prompt-budget")
+    parser.add_argument('--prompt-budget', type=int, default=3000,
+                        help="token budget per generation prompt when --compact is set")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always call the API instead of reusing cached responses")
+    parser.add_argument('--cache-dir', default='.llm_cache',
+                        help="directory holding the response and execution caches")
+    parser.add_argument('--no-exec-cache', action='store_true',
+                        help="run every simulation, even if its script and simulation_utils.py are unchanged since it last ran")
+    parser.add_argument('--sim-seed', type=int, default=None,
+                        help="PYTHONHASHSEED of the simulations (random by default); part of the execution cache key")
+    parser.add_argument('--cache-max-mb', type=int, default=256,
+                        help="size bound of the response cache, least recently used entries are evicted first")
+    parser.add_argument('--rpm', type=int, default=500,
+                        help="requests per minute allowed by the account (updated from the x-ratelimit-* headers, 0 disables throttling)")
+    parser.add_argument('--tpm', type=int, default=200000,
+                        help="tokens per minute allowed by the account (updated from the x-ratelimit-* headers)")
+    parser.add_argument('--max-attempts', type=int, default=5,
+                        help="attempts per API call before the claim is given up on (0 disables retries)")
+    parser.add_argument('--attempt-timeout', type=float, default=120.0,
+                        help="seconds before a single API attempt times out and is retried")
+    parser.add_argument('--telemetry', default='telemetry.jsonl',
+                        help="JSONL file receiving per-call usage, latency and cost records")
+    parser.add_argument('--manifest', default='run_manifest.jsonl',
+                        help="journal of the stages each claim has completed")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip the stages the manifest records as completed instead of starting over")
+    return parser.parse_args()
+
+
+def make_config(args):
+    # The PipelineConfig main() runs with. Opens the caches, telemetry and cascade log lazily, and starts
+    # the simulation pool when --sim-pool is given; PipelineConfig.close shuts them all down.
+    config = PipelineConfig()
+    if not args.no_cache:
+        config.response_cache = ResponseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    if not args.no_exec_cache:
+        config.execution_cache = ExecutionCache(args.cache_dir)
+
+    # the offline backends have no account limits to respect
+    if args.rpm > 0 and args.backend == 'openai':
+        config.rate_limiter = RateLimiter(args.rpm, args.tpm)
+    else:
+        config.rate_limiter = None
+
+    if args.max_attempts > 0:
+        config.retry_policy = RetryPolicy(args.max_attempts, args.attempt_timeout)
+    else:
+        config.retry_policy = None
+
+    config.stream_generation = args.stream
+    config.local_verdicts = not args.no_local_verdicts
+    config.repair_attempts = args.repair_attempts
+    config.repair_budget = args.repair_budget
+    config.samples = args.samples
+    config.sample_temperature = args.sample_temperature
+    if config.samples > 1 and args.batch:
+        print("--samples is not supported with --batch, generating one simulation per claim")
+    config.simulation_timeout = args.sim_timeout
+    config.max_output_bytes = args.max_output_bytes
+    config.simulation_cpu_seconds = args.sim_cpu_seconds or None
+    config.simulation_memory_mb = args.sim_memory_mb or None
+    if args.sim_seed is not None:
+        # set before the pool starts, whose children inherit the server's hash seed
+        os.environ['PYTHONHASHSEED'] = str(args.sim_seed)
+    if args.sim_pool:
+        config.simulation_pool = SimulationPool('simscripts')
+    config.generation_models = cascade_order(args.models)
+    config.verification_model = args.verification_model
+    if len(config.generation_models) > 1:
+        print("model cascade:", ' -> '.join(config.generation_models))
+        if args.batch or config.samples > 1:
+            print(f"the model cascade is not supported with --batch or --samples, generating with {config.generation_models[0]} only")
+        else:
+            config.cascade_log = CascadeLog()
+    if args.compact:
+        config.prompt_budget = args.prompt_budget
+        if os.path.exists('gpt_results/compaction_report.jsonl'):
+            os.remove('gpt_results/compaction_report.jsonl')
+
+    config.telemetry = Telemetry(args.telemetry)
+    return config
+
+
+def report(config):
+    response_cache, execution_cache = config.response_cache, config.execution_cache
+    if response_cache is not None:
+        print("response cache:", response_cache.stats())
+    if execution_cache is not None and execution_cache.hits + execution_cache.misses:
+        print(f"execution cache: {execution_cache.hits} simulations reused, {execution_cache.misses} run", execution_cache.stats())
+    stats = config.stats
+    compaction, prompt_cache, samples = stats.compaction, stats.prompt_cache, stats.samples
+    if compaction['claims']:
+        saved = compaction['original_tokens'] - compaction['compacted_tokens']
+        print(f"prompt compaction saved {saved} tokens over {compaction['claims']} prompts "
+              f"({saved / compaction['original_tokens']:.0%}), see gpt_results/compaction_report.jsonl")
+    if prompt_cache['prompt_tokens']:
+        cached_share = prompt_cache['cached_tokens'] / prompt_cache['prompt_tokens']
+        print(f"provider prompt cache: {prompt_cache['cached_tokens']} of {prompt_cache['prompt_tokens']} prompt tokens cached ({cached_share:.0%})")
+    if samples['claims']:
+        print(f"sampling: {samples['executed']} of {samples['candidates']} candidate simulations executed "
+              f"over {samples['claims']} claims, {samples['llm_verified']} verified by the LLM")
+    if config.cascade_log is not None and config.cascade_log.counts:
+        print("model cascade decisions:", config.cascade_log.summary(), "see gpt_results/cascade_log.jsonl")
+    repairs, verifications = stats.repairs, stats.verifications
+    if repairs['claims']:
+        print(f"repairs: {repairs['repaired']} of {repairs['claims']} failed simulations fixed "
+              f"in {repairs['attempts']} attempts, {repairs['tokens']} tokens")
+    if verifications['local']:
+        print(f"local verdicts: {verifications['local']} of {verifications['local'] + verifications['llm']} claims "
+              f"verified from the simulation output, saving {verifications['local']} LLM calls")
+    if config.retry_policy is not None:
+        print(f"api retries: {config.retry_policy.retries}, circuit breaker trips: {config.retry_policy.breaker.trips}")
+
+
+def main():
+    args = parse_args()
+    if args.backend != 'openai' or args.base_url is not None:
+        from llm_backend import make_backend
+        use_backend(make_backend(args.backend, args.base_url, args.latency, args.seed))
+    config = make_config(args)
+
+    manifest = RunManifest(args.manifest, resume=args.resume)
+    if args.resume:
+        print("resuming, completed stages:", manifest.summary())
+
+    try:
+        if args.batch:
+            gen_and_run_sims_batch(config, manifest, args.batch_dir, args.poll_interval, args.sim_workers)
+        else:
+            asyncio.run(gen_and_run_sims(config, max(args.concurrency, 1), args.sim_workers, manifest, args.verify_batch_size))
+        report(config)
+    finally:
+        manifest.close()
+        config.close()
+        if backend is not None:
+            backend.close()
 
 
 if __name__ == '__main__':
-    gen_and_run_sims()
+    main()
@@ -1,36 +1,28 @@
-from ast import literal_eval
-import os
-import re
-
 import pandas as pd
 import numpy as np
 
+from claim_planning import artifact_id, with_doc_ids
+from verification_results import load_verdicts
+
 
-train_annotated = pd.read_json('data/data/processed_data/extended_train_annotated.jsonl', lines=True)
+train_annotated = with_doc_ids(pd.read_json('data/data/processed_data/extended_train_annotated.jsonl', lines=True))
 ver_dir = 'gpt_ver_results'
-ver_files = [filename for filename in os.listdir(ver_dir) if filename.startswith("response")]
 
 train_results = train_annotated[train_annotated['category'].isin(['medical', 'cellular', 'directional'])].copy()
 train_results['label'] = np.where(train_results['label'] == 'CONTRADICT', 'Refuted', 'Supported')
 
-train_results['verification_result'] = None
-train_results['reason'] = None
-
-
-for r in ver_files:
-    with open(os.path.join(ver_dir, r), 'r') as f:
-        ver_res = f.read()
-    
-    target_id = int(r.split('_')[-1].split('.')[0])
-    from_code = re.findall(r'```python(.*?)```', ver_res, re.DOTALL)
-
-    if from_code:
-        ver_res = from_code[0].strip()
-    
-    ver_res = literal_eval(ver_res)
-    
-    train_results.loc[train_results['id'] == target_id, 'verification_result'] = ver_res['verification_result']
-    train_results.loc[train_results['id'] == target_id, 'reason'] = ver_res['reason']
+# results are keyed {id}_{doc_id}; runs from before claims were keyed by document wrote one result per id.
+# The per-id results are only read from a directory holding none of the new ones, so a claim missing from
+# a new run is not given the verdict of an older run unzipped next to it
+verdicts = load_verdicts(ver_dir)
+keys = [artifact_id(id, doc_id) for id, doc_id in zip(train_results['id'], train_results['doc_id'])]
+if not any(key in verdicts for key in keys):
+    keys = [str(id) for id in train_results['id']]
+found = [verdicts.get(key) or {} for key in keys]
+train_results['verification_result'] = [verdict.get('verification_result') for verdict in found]
+train_results['reason'] = [verdict.get('reason') for verdict in found]
+# 'timeout' or 'resource_exceeded' for simulations stopped by their limits, which verify as None
+train_results['simulation_status'] = [verdict.get('simulation_status') for verdict in found]
 
 train_results['matched'] = train_results.apply(lambda x: x['verification_result'] == x['label'], axis=1)
 train_results['verification_result'] = train_results['verification_result'].astype(str)
@@ -52,6 +44,9 @@ for category, group in groups:
     # Count the None values in 'verification_result' as errors
     errors = (group['verification_result']=='None').sum()
 
+    # Count the errors that come from simulations stopped by their time, CPU, memory or output limits
+    stopped = group['simulation_status'].notna().sum()
+
     total = len(group)
     
     # Store the results in the dictionary
@@ -59,6 +54,7 @@ for category, group in groups:
         'correct_match': correct_match,
         'incorrect_match': incorrect_match,
         'errors': errors,
+        'stopped_by_limits': stopped,
         'total': total
     }
 
@@ -0,0 +1,117 @@
+import hashlib
+import importlib.machinery
+import json
+import os
+import re
+import sys
+
+from lru_store import LRUStore
+from simulation_runner import SimulationResult
+
+
+file_hashes = {}
+
+
+def file_hash(path):
+    # sha256 of a file's content, recomputed only when its size or mtime changes
+    stat = os.stat(path)
+    signature = (path, stat.st_size, stat.st_mtime_ns)
+    if signature not in file_hashes:
+        with open(path, 'rb') as f:
+            file_hashes[signature] = hashlib.sha256(f.read()).hexdigest()
+    return file_hashes[signature]
+
+
+# import statements anywhere in a file, read without parsing it; a match inside a string only adds a dependency
+IMPORT_LINE = re.compile(r'^[ \t]*(?:from[ \t]+(\w+)[\w.]*[ \t]+import\b|import[ \t]+([\w., \t]+))', re.MULTILINE)
+
+
+def imported_names(path):
+    names = set()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for module, modules in IMPORT_LINE.findall(f.read()):
+            if module:
+                names.add(module)
+            else:
+                names.update(name.split()[0].split('.')[0] for name in modules.split(',') if name.strip())
+    return names
+
+
+def local_dependencies(path, found=None):
+    # Source files of the modules a script imports from its own directory, which is sys.path[0] when it
+    # runs (simulation_utils.py for the generated simulations), followed recursively
+    found = {} if found is None else found
+    directory = os.path.dirname(os.path.abspath(path))
+    for name in sorted(imported_names(path)):
+        spec = importlib.machinery.PathFinder.find_spec(name, [directory])
+        if spec is not None and spec.origin and spec.origin.endswith('.py') and spec.origin not in found.values():
+            found[name] = spec.origin
+            local_dependencies(spec.origin, found)
+    return found
+
+
+def execution_key(code_filepath, limits=()):
+    # sha256 over everything a run's output depends on: the script, the local modules it imports, the
+    # interpreter, the hash seed the simulations get (PYTHONHASHSEED) and the limits they run under
+    payload = {
+        'script': file_hash(code_filepath),
+        'dependencies': {name: file_hash(path) for name, path in sorted(local_dependencies(code_filepath).items())},
+        'python': [sys.executable, sys.version],
+        'seed': os.environ.get('PYTHONHASHSEED'),
+        'limits': list(limits),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ExecutionCache():
+    # Persistent cache of simulation results keyed on execution_key, kept in an LRUStore bounded to
+    # max_bytes. Runs that timed out are not stored, since whether a run finishes in time depends on
+    # the load of the machine as much as on the script, and neither are cancelled runs.
+    def __init__(self, cache_dir='.llm_cache', max_bytes=256 * 1024 * 1024):
+        self.store = LRUStore(os.path.join(cache_dir, 'executions.sqlite'), max_bytes)
+
+    @property
+    def hits(self):
+        return self.store.hits
+
+    @property
+    def misses(self):
+        return self.store.misses
+
+    # Return the cached SimulationResult for this key, or None on a miss
+    def get(self, key):
+        encoded = self.store.get(key)
+        if encoded is None:
+            return None
+        result = SimulationResult(**json.loads(encoded))
+        result.cached = True
+        return result
+
+    # Store a SimulationResult for this key
+    def put(self, key, result):
+        if result.timed_out or result.cancelled:
+            return
+        self.store.put(key, json.dumps({
+            'std_out': result.std_out,
+            'std_err': result.std_err,
+            'exit_code': result.exit_code,
+            'wall_time': result.wall_time,
+            'truncated': result.truncated,
+            'exceeded': result.exceeded,
+            'peak_rss_mb': result.peak_rss_mb,
+        }, ensure_ascii=False))
+
+    def run(self, run, code_filepath, timeout=60.0, max_output_bytes=1_000_000, cpu_seconds=None, memory_mb=None, cancellation=None):
+        # run(code_filepath, ...) through the cache: the cached result when nothing it depends on changed
+        key = execution_key(code_filepath, (timeout, max_output_bytes, cpu_seconds, memory_mb))
+        result = self.get(key)
+        if result is None:
+            result = run(code_filepath, timeout, max_output_bytes, cpu_seconds, memory_mb, cancellation)
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        return self.store.stats()
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,38 @@
+import os
+
+import openai
+
+from local_openai_server import LocalOpenAIServer, ReplayResponder, canned_responder, make_latency
+
+
+class OpenAIBackend():
+    # The pipeline's model access: a sync and an async OpenAI-compatible client.
+    # Retries are handled by retry_policy, so the clients themselves give up after one attempt.
+    def __init__(self, api_key=None, base_url=None):
+        api_key = api_key or os.environ.get('OPENAI_API_KEY')
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.async_client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+    def close(self):
+        self.client.close()
+
+
+class LocalBackend(OpenAIBackend):
+    # Serves the given responder from an in-process LocalOpenAIServer, so the whole pipeline runs with no network
+    def __init__(self, responder=canned_responder, latency=None):
+        self.server = LocalOpenAIServer(responder, latency=latency).start()
+        super().__init__(api_key='local', base_url=self.server.base_url)
+
+    def close(self):
+        super().close()
+        self.server.stop()
+
+
+def make_backend(name='openai', base_url=None, latency=None, seed=0):
+    if name == 'openai':
+        return OpenAIBackend(base_url=base_url)
+    if name == 'canned':
+        return LocalBackend(canned_responder, make_latency(latency, seed))
+    if name == 'replay':
+        return LocalBackend(ReplayResponder(), make_latency(latency, seed))
+    raise ValueError(f"unknown backend {name!r}")
@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+
+from lru_store import LRUStore
+
+
+# request arguments that change how a call is sent, not what the model returns
+TRANSPORT_KWARGS = {'timeout', 'extra_headers', 'extra_query', 'extra_body'}
+
+
+def cache_key(kwargs):
+    # sha256 over the model, the messages and every sampling parameter of the request
+    payload = {k: v for k, v in kwargs.items() if k not in TRANSPORT_KWARGS}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResponseCache():
+    # Persistent cache of chat completions, keyed on the request by cache_key and kept in an
+    # LRUStore bounded to max_bytes
+    def __init__(self, cache_dir='.llm_cache', max_bytes=256 * 1024 * 1024):
+        self.store = LRUStore(os.path.join(cache_dir, 'responses.sqlite'), max_bytes)
+
+    @property
+    def hits(self):
+        return self.store.hits
+
+    @property
+    def misses(self):
+        return self.store.misses
+
+    # Return the cached ChatCompletion for these request kwargs, or None on a miss
+    def get(self, kwargs):
+        from openai.types.chat import ChatCompletion
+
+        encoded = self.store.get(cache_key(kwargs))
+        return ChatCompletion.model_validate_json(encoded) if encoded is not None else None
+
+    # Store a ChatCompletion for these request kwargs
+    def put(self, kwargs, response):
+        self.store.put(cache_key(kwargs), response.model_dump_json())
+
+    def stats(self):
+        return self.store.stats()
+
+    def close(self):
+        self.store.close()
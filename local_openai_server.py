@@ -0,0 +1,325 @@
+import argparse
+import email.parser
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from ast import literal_eval
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Local stand-in for the parts of the OpenAI API the pipeline uses: chat completions,
+# file upload/download and the Batch API. Point a client at it with base_url=server.base_url.
+# Responders are called with the request body and lowercased headers and return the reply text.
+
+
+def canned_responder(body, headers=None):
+    # Answer generation prompts with a tiny simulation and verification prompts with a verdict
+    user_prompt = body['messages'][-1]['content']
+    if 'Simulation Output' in user_prompt:
+        return '{"claim": "", "verification_result": "Supported", "reason": "canned response from the local server"}'
+    return 'Here is the simulation:\n```\nprint("Supported: canned simulation")\n```'
+
+
+def make_latency(spec, seed=0):
+    # Latency distribution for the local server, in seconds:
+    # "none", "fixed:S", "uniform:LOW:HIGH" or "lognormal:MEDIAN:SIGMA"
+    rng = random.Random(seed)
+    kind, *params = (spec or 'none').split(':')
+    params = [float(p) for p in params]
+    if kind == 'none':
+        return None
+    if kind == 'fixed':
+        return lambda: params[0]
+    if kind == 'uniform':
+        return lambda: rng.uniform(params[0], params[1])
+    if kind == 'lognormal':
+        median, sigma = params
+        return lambda: rng.lognormvariate(0, sigma) * median
+    raise ValueError(f"unknown latency distribution {spec!r}")
+
+
+class ReplayResponder():
+    # Answers requests with the responses recorded in gpt_results.zip / gpt_ver_results.zip.
+    # The claim id comes from the X-Claim-Id header the pipeline sends (or a batch custom_id),
+    # falling back to matching the prompt's "Claim:" line against the recorded prompts.
+    def __init__(self, results_zip='gpt_results.zip', ver_results_zip='gpt_ver_results.zip'):
+        self.generation, generation_claims = self.load(results_zip)
+        self.verification, verification_claims = self.load(ver_results_zip)
+        self.claim_ids = {**generation_claims, **verification_claims}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        responses = {}
+        claims = {}
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                match = re.search(r'(prompt|response)_(\d+)\.txt$', name)
+                if not match:
+                    continue
+                text = archive.read(name).decode('utf-8')
+                if match.group(1) == 'response':
+                    responses[int(match.group(2))] = text
+                else:
+                    claim = re.search(r'Claim: (.*)', text)
+                    if claim:
+                        claims[claim.group(1).strip()] = int(match.group(2))
+        return responses, claims
+
+    def claim_id(self, prompt, headers):
+        # the pipeline sends artifact ids ({id}_{doc_id}); recordings are keyed by the dataset id
+        if headers.get('x-claim-id'):
+            return int(re.match(r'\d+', headers['x-claim-id']).group())
+        claim = re.search(r'Claim: (.*)', prompt)
+        return self.claim_ids.get(claim.group(1).strip()) if claim else None
+
+    def __call__(self, body, headers):
+        prompt = body['messages'][-1]['content']
+        if 'Item c' in prompt:
+            return self.batch_verification(prompt, headers)
+        if '<<<<<<< SEARCH' in body['messages'][0]['content']:
+            # nothing recorded for repairs; a reply without edits leaves the script as it is
+            self.misses += 1
+            return "No edits."
+
+        recorded = self.verification if 'Simulation Output' in prompt else self.generation
+        response = recorded.get(self.claim_id(prompt, headers))
+        if response is None:
+            self.misses += 1
+            return canned_responder(body, headers)
+        self.hits += 1
+        return response
+
+    def batch_verification(self, prompt, headers):
+        # ids arrive in item order as X-Claim-Ids; recorded verdicts are python dict text
+        ids = [int(re.match(r'\d+', i).group()) for i in headers.get('x-claim-ids', '').split(',') if i]
+        results = []
+        for n, id in enumerate(ids, start=1):
+            try:
+                verdict = literal_eval(re.sub(r'```(?:python)?', '', self.verification[id]).strip())
+            except (KeyError, ValueError, SyntaxError):
+                self.misses += 1
+                continue
+            self.hits += 1
+            results.append({'id': f'c{n}', 'verification_result': verdict.get('verification_result'),
+                            'reason': verdict.get('reason')})
+        return json.dumps({'results': results})
+
+
+def count_tokens(text):
+    return len(text) // 4 + 1
+
+
+def make_completion(body, content, completion_id):
+    # n > 1 returns the same content n times, like sampling a model that always agrees with itself
+    n = body.get('n') or 1
+    prompt_tokens = sum(count_tokens(m.get('content') or '') for m in body['messages'])
+    completion_tokens = count_tokens(content) * n
+    return {
+        'id': f'chatcmpl-{completion_id}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'gpt-4o-mini'),
+        'choices': [{'index': i, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}} for i in range(n)],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+
+class LocalOpenAIServer():
+    def __init__(self, responder=canned_responder, host='127.0.0.1', port=0, batch_polls=1, latency=None):
+        self.responder = responder
+        self.latency = latency  # callable returning seconds to wait before each chat completion
+        self.batch_polls = batch_polls  # how many retrievals a batch reports in_progress before completing
+        self.files = {}
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self.make_handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def next_id(self, prefix):
+        with self.lock:
+            return f'{prefix}-{next(self.ids)}'
+
+    def complete(self, body, headers=None):
+        if self.latency is not None:
+            with self.lock:
+                delay = self.latency()
+            time.sleep(delay)
+        return make_completion(body, self.responder(body, headers or {}), self.next_id('local'))
+
+    def add_file(self, filename, purpose, content):
+        file_id = self.next_id('file')
+        self.files[file_id] = {
+            'object': {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                       'filename': filename, 'purpose': purpose, 'status': 'processed'},
+            'content': content,
+        }
+        return self.files[file_id]['object']
+
+    def create_batch(self, body):
+        batch_id = self.next_id('batch')
+        self.batches[batch_id] = {
+            'id': batch_id, 'object': 'batch', 'endpoint': body['endpoint'], 'input_file_id': body['input_file_id'],
+            'completion_window': body['completion_window'], 'status': 'in_progress', 'created_at': int(time.time()),
+            'metadata': body.get('metadata'), 'output_file_id': None, 'error_file_id': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            'polls_left': self.batch_polls,
+        }
+        return self.batch_object(batch_id)
+
+    def batch_object(self, batch_id):
+        return {k: v for k, v in self.batches[batch_id].items() if k != 'polls_left'}
+
+    def retrieve_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        if batch['status'] == 'in_progress':
+            if batch['polls_left'] > 0:
+                batch['polls_left'] -= 1
+            else:
+                self.run_batch(batch)
+        return self.batch_object(batch_id)
+
+    def run_batch(self, batch):
+        outputs, errors = [], []
+        lines = self.files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+        for line in filter(None, lines):
+            request = json.loads(line)
+            try:
+                # batch requests carry no headers, but their custom_id is the claim's artifact id
+                completion = self.complete(request['body'], {'x-claim-id': request['custom_id']})
+            except Exception as e:
+                errors.append({'id': self.next_id('batch_req'), 'custom_id': request['custom_id'], 'response': None,
+                               'error': {'code': 'server_error', 'message': str(e)}})
+                continue
+            outputs.append({'id': self.next_id('batch_req'), 'custom_id': request['custom_id'], 'error': None,
+                            'response': {'status_code': 200, 'request_id': completion['id'], 'body': completion}})
+
+        batch['output_file_id'] = self.add_file('output.jsonl', 'batch_output',
+                                                ''.join(json.dumps(o) + '\n' for o in outputs).encode('utf-8'))['id']
+        if errors:
+            batch['error_file_id'] = self.add_file('errors.jsonl', 'batch_output',
+                                                   ''.join(json.dumps(e) + '\n' for e in errors).encode('utf-8'))['id']
+        batch['request_counts'] = {'total': len(outputs) + len(errors), 'completed': len(outputs), 'failed': len(errors)}
+        batch['status'] = 'completed'
+        batch['completed_at'] = int(time.time())
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            # Server-sent events in the chat.completion.chunk format, a few characters per chunk
+            def send_stream(self, body, completion):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+
+                content = completion['choices'][0]['message']['content']
+                base = {'id': completion['id'], 'object': 'chat.completion.chunk',
+                        'created': completion['created'], 'model': completion['model']}
+                chunks = [{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}]
+                chunks += [{'index': 0, 'delta': {'content': content[i:i + 16]}, 'finish_reason': None}
+                           for i in range(0, len(content), 16)]
+                chunks += [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+                events = [dict(base, choices=[choice]) for choice in chunks]
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    events.append(dict(base, choices=[], usage=completion['usage']))
+
+                try:
+                    for event in events:
+                        self.wfile.write(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+                        self.wfile.flush()
+                    self.wfile.write(b'data: [DONE]\n\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client hung up early, which streaming callers do on purpose
+                    pass
+
+            def read_body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def do_GET(self):
+                match = re.fullmatch(r'/v1/files/([^/]+)/content', self.path)
+                if match and match.group(1) in server.files:
+                    data = server.files[match.group(1)]['content']
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                match = re.fullmatch(r'/v1/batches/([^/]+)', self.path)
+                if match and match.group(1) in server.batches:
+                    self.send_json(200, server.retrieve_batch(match.group(1)))
+                    return
+
+                self.send_json(404, {'error': {'message': f'unknown path {self.path}'}})
+
+            def do_POST(self):
+                if self.path == '/v1/chat/completions':
+                    body = json.loads(self.read_body())
+                    headers = {k.lower(): v for k, v in self.headers.items()}
+                    if body.get('stream'):
+                        self.send_stream(body, server.complete(body, headers))
+                    else:
+                        self.send_json(200, server.complete(body, headers))
+                elif self.path == '/v1/batches':
+                    self.send_json(200, server.create_batch(json.loads(self.read_body())))
+                elif self.path == '/v1/files':
+                    # multipart/form-data with a `purpose` field and a `file` part
+                    header = f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode('utf-8')
+                    message = email.parser.BytesParser().parsebytes(header + self.read_body())
+                    fields = {part.get_param('name', header='content-disposition'): part for part in message.get_payload()}
+                    purpose = fields['purpose'].get_payload(decode=True).decode('utf-8')
+                    upload = fields['file']
+                    self.send_json(200, server.add_file(upload.get_filename(), purpose, upload.get_payload(decode=True)))
+                else:
+                    self.send_json(404, {'error': {'message': f'unknown path {self.path}'}})
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenAI chat, files and batch endpoints")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--replay', action='store_true',
+                        help="answer with the responses recorded in gpt_results.zip and gpt_ver_results.zip")
+    parser.add_argument('--latency', default='none',
+                        help="latency per completion: none, fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    responder = ReplayResponder() if args.replay else canned_responder
+    server = LocalOpenAIServer(responder, port=args.port, latency=make_latency(args.latency, args.seed))
+    print(f"serving on {server.base_url}, run the pipeline with --base-url {server.base_url}")
+    server.httpd.serve_forever()
@@ -0,0 +1,56 @@
+import collections
+import json
+import os
+import threading
+import time
+
+from telemetry import model_prices
+
+
+def cascade_order(models):
+    # The models in the order given, without repeats. Only four models have known prices, so the order
+    # is not re-sorted; a warning says when the priced ones are not listed cheapest first
+    models = list(dict.fromkeys(models))
+    priced = [(model, model_prices(model)) for model in models if model_prices(model) is not None]
+    costs = [prices[0] + prices[2] for _, prices in priced]
+    if costs != sorted(costs):
+        listed = ', '.join(f"{model} ${cost:g}/M" for (model, _), cost in zip(priced, costs))
+        print(f"warning: --models is not ordered cheapest first ({listed}); every claim still starts on {models[0]}")
+    return models
+
+
+class CascadeLog():
+    # JSONL journal of every cascade decision: a model's attempt at a claim is accepted, escalated
+    # to the next model (with the reason), or the last model's attempt is kept although it failed
+    def __init__(self, path='gpt_results/cascade_log.jsonl'):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def record(self, id, model, decision, reason=None, next_model=None):
+        record = {'time': time.time(), 'claim_id': str(id), 'model': model, 'decision': decision,
+                  'reason': reason, 'next_model': next_model}
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            self.counts[(model, decision)] += 1
+
+        if decision == 'escalate':
+            print(f"claim {id}: {reason} with {model}, escalating to {next_model}")
+        elif decision == 'exhausted':
+            print(f"claim {id}: {reason} with {model}, no stronger model left")
+
+    def summary(self):
+        models = list(dict.fromkeys(model for model, _ in self.counts))
+        return {model: {decision: self.counts[(model, decision)] for decision in ('accept', 'escalate', 'exhausted')}
+                for model in models}
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
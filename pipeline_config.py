@@ -0,0 +1,80 @@
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
+
+
+class RunStats():
+    # Counters of one pipeline run, printed by cot.report. They live on the run's config, so runs in
+    # the same process (e.g. the concurrency levels of bench_pipeline.py) are counted separately
+    def __init__(self):
+        # --compact: prompts compacted and their tokens before and after
+        self.compaction = {'claims': 0, 'original_tokens': 0, 'compacted_tokens': 0}
+        # prompt tokens the provider reported as served from its prompt cache
+        self.prompt_cache = {'prompt_tokens': 0, 'cached_tokens': 0}
+        # claims whose simulation went to repair
+        self.repairs = {'claims': 0, 'attempts': 0, 'repaired': 0, 'tokens': 0}
+        # verdicts taken from the simulation output and verdicts left to the LLM
+        self.verifications = {'local': 0, 'llm': 0}
+        # claims sampled with --samples
+        self.samples = {'claims': 0, 'candidates': 0, 'executed': 0, 'llm_verified': 0}
+
+
+class PipelineConfig():
+    # Settings and shared services of one pipeline run, passed to every stage of cot.py. The defaults
+    # are what a library caller gets: no caches, no telemetry and no pool, so a stage writes nothing
+    # but its own result files. cot.make_config builds the one main() runs with from the flags.
+    def __init__(self):
+        # temperature is pinned to 0, so identical requests are answered from the on-disk response cache
+        self.response_cache = None
+        # simulations whose script, local imports, interpreter, hash seed and limits are unchanged reuse their last result
+        self.execution_cache = None
+        # shared by every worker so concurrent claims stay under the account's RPM/TPM limits
+        self.rate_limiter = RateLimiter()
+        # short per-attempt timeouts with backoff, and a circuit breaker shared by all workers
+        self.retry_policy = RetryPolicy()
+        # one JSONL record per LLM call, parse and simulation run; summarize with `python telemetry.py summary`
+        self.telemetry = None
+
+        # --stream: generation responses are streamed and cut off once the code block is closed
+        self.stream_generation = False
+        # --compact: token budget for generation prompts; None sends the full templates and abstract
+        self.prompt_budget = None
+        # the templates without comments, built on first use once a prompt budget is set
+        self.compacted_templates = None
+
+        # --models: generation models from cheapest to strongest. A claim moves on to the next model
+        # when its simulation still fails after repair or its verification comes back without a verdict
+        self.generation_models = ['gpt-4o-mini']
+        self.verification_model = 'gpt-4o-mini'
+        # set when there is more than one generation model
+        self.cascade_log = None
+
+        # --samples: each claim gets this many candidate simulations from a single n>1 request at
+        # sample_temperature, executed in parallel and settled by majority vote on their verdicts
+        self.samples = 1
+        self.sample_temperature = 0.7
+
+        # --sim-timeout, --max-output-bytes, --sim-cpu-seconds and --sim-memory-mb: limits of each
+        # simulation run. Wall-clock seconds before its process group is killed, bytes of stdout and of
+        # stderr it may write before it is stopped, CPU seconds and address space in MB (None for no limit)
+        self.simulation_timeout = 60.0
+        self.max_output_bytes = 1_000_000
+        self.simulation_cpu_seconds = 30
+        self.simulation_memory_mb = 1024
+        # --sim-pool: simulations are forked from a server that has already imported simulation_utils
+        self.simulation_pool = None
+
+        # --repair-attempts and --repair-budget: a failed simulation is sent back to the model with its
+        # traceback for a minimal patch and re-run, at most repair_attempts times and repair_budget tokens per claim
+        self.repair_attempts = 2
+        self.repair_budget = 4000
+
+        # cleared by --no-local-verdicts: verdicts the simulation states plainly, and the None verdict of a
+        # simulation that failed pre-flight or was stopped by a limit, are taken without asking the LLM
+        self.local_verdicts = True
+
+        self.stats = RunStats()
+
+    def close(self):
+        for service in (self.telemetry, self.cascade_log, self.simulation_pool, self.response_cache, self.execution_cache):
+            if service is not None:
+                service.close()
@@ -0,0 +1,67 @@
+import io
+import re
+import tokenize
+
+
+# Strip comments and blank lines from Python source, leaving the code itself untouched
+def strip_code_comments(source):
+    comments = {}
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        if token.type == tokenize.COMMENT:
+            row, col = token.start
+            comments[row] = col
+
+    lines = []
+    for row, line in enumerate(source.splitlines(), start=1):
+        if row in comments:
+            line = line[:comments[row]]
+        line = line.rstrip()
+        if line.strip():
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+# Character spans of the sentences in an abstract
+def sentence_spans(text):
+    spans = []
+    start = 0
+    for match in re.finditer(r'(?<=[.!?])\s+', text):
+        spans.append((start, match.start()))
+        start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+
+# Drop the abstract sentences farthest from the gold evidence until the abstract fits in max_tokens.
+# Sentences overlapping the gold evidence are always kept, and the survivors stay in their original order.
+def trim_abstract(abstract, gold_evidence, max_tokens, count_tokens):
+    if count_tokens(abstract) <= max_tokens:
+        return abstract, 0
+
+    spans = sentence_spans(abstract)
+    gold_spans = []
+    for sentence in gold_evidence:
+        start = abstract.find(sentence.strip())
+        if start >= 0:
+            gold_spans.append((start, start + len(sentence.strip())))
+
+    gold_indices = [i for i, (start, end) in enumerate(spans)
+                    if any(start < gold_end and gold_start < end for gold_start, gold_end in gold_spans)]
+    if not gold_indices:
+        # nothing to anchor on, so keep the opening of the abstract
+        gold_indices = [0]
+
+    def distance(i):
+        return min(abs(i - g) for g in gold_indices)
+
+    kept = set(range(len(spans)))
+    # farthest first; among equally far sentences, drop the later one first
+    for i in sorted(kept - set(gold_indices), key=lambda i: (distance(i), i), reverse=True):
+        text = ' '.join(abstract[start:end] for j, (start, end) in enumerate(spans) if j in kept)
+        if count_tokens(text) <= max_tokens:
+            break
+        kept.discard(i)
+
+    text = ' '.join(abstract[start:end] for j, (start, end) in enumerate(spans) if j in kept)
+    return text, len(spans) - len(kept)
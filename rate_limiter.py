@@ -0,0 +1,126 @@
+import asyncio
+import functools
+import threading
+import time
+
+# completion tokens assumed for a request that doesn't set max_tokens
+EXPECTED_COMPLETION_TOKENS = 1024
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model="gpt-4o-mini"):
+    # tiktoken is optional and slow to import, so it is only loaded once tokens are counted
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabularies on first use, which fails offline
+        print(f"tiktoken unavailable ({type(e).__name__}), estimating ~4 characters per token")
+        return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    # Count with tiktoken when it is installed, otherwise fall back to ~4 characters per token
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def estimate_prompt_tokens(messages, model="gpt-4o-mini"):
+    tokens = 3  # every reply is primed with <|start|>assistant<|message|>
+    for message in messages:
+        tokens += 4  # role and message delimiters
+        tokens += count_tokens(message.get("content") or "", model)
+    return tokens
+
+
+def estimate_request_tokens(kwargs):
+    # TPM limits count the prompt plus the completion the request may produce
+    completion_tokens = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or EXPECTED_COMPLETION_TOKENS
+    return estimate_prompt_tokens(kwargs["messages"], kwargs.get("model", "gpt-4o-mini")) + completion_tokens
+
+
+class TokenBucket():
+    # Bucket refilled continuously at capacity per minute. Reservations may drive the level negative,
+    # and the caller then waits until the refill brings it back to zero, so requests queue up in order.
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        self.refill(now)
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level / self.rate
+
+    def set_rate(self, per_minute, now):
+        self.refill(now)
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = min(self.level, self.capacity)
+
+    def cap_level(self, level, now):
+        self.refill(now)
+        self.level = min(self.level, level)
+
+
+class RateLimiter():
+    # Shared requests-per-minute and tokens-per-minute scheduler for chat completion calls.
+    # Limits start from the configured values and follow the x-ratelimit-* headers of each response,
+    # keeping `headroom` of the account limit in reserve so throughput sits just under it.
+    def __init__(self, rpm=500, tpm=200000, headroom=0.9):
+        self.headroom = headroom
+        self.requests = TokenBucket(rpm * headroom)
+        self.tokens = TokenBucket(tpm * headroom)
+        self.lock = threading.Lock()
+
+    def reserve(self, kwargs):
+        estimate = estimate_request_tokens(kwargs)
+        with self.lock:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1, now), self.tokens.reserve(estimate, now))
+        return estimate, wait
+
+    # Wait until the request fits under both limits, returning the token estimate charged for it
+    async def acquire(self, kwargs):
+        estimate, wait = self.reserve(kwargs)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return estimate
+
+    # Replace the estimate charged in acquire with the tokens the call actually used
+    def reconcile(self, estimate, usage):
+        if usage is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens.refill(now)
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimate - usage.total_tokens)
+
+    def update_from_headers(self, headers):
+        with self.lock:
+            now = time.monotonic()
+            for bucket, kind in [(self.requests, "requests"), (self.tokens, "tokens")]:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                if limit is not None:
+                    bucket.set_rate(float(limit) * self.headroom, now)
+
+                # the server also sees other clients on the account, so trust it when it reports less left than we think
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is not None:
+                    reserve = bucket.capacity / self.headroom - bucket.capacity
+                    bucket.cap_level(float(remaining) - reserve, now)
@@ -0,0 +1,129 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+
+
+# errors worth another attempt: the request itself was fine, the service was not
+RETRYABLE_ERRORS = ('APITimeoutError', 'APIConnectionError', 'RateLimitError', 'InternalServerError')
+
+
+def is_retryable(error):
+    import openai
+
+    if isinstance(error, tuple(getattr(openai, name) for name in RETRYABLE_ERRORS)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in (408, 409, 502, 503, 504)
+
+
+def retry_after(error):
+    # seconds the server asked us to wait, if it said so
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker():
+    # Opens when at least `threshold` of the last `window` calls failed, pausing every worker
+    # for `cooldown` seconds instead of letting them all hammer an API that is down.
+    def __init__(self, window=20, threshold=0.5, cooldown=30.0, min_calls=5):
+        self.outcomes = collections.deque(maxlen=window)
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.min_calls = min_calls
+        self.open_until = 0.0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def record(self, success):
+        with self.lock:
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.threshold:
+                self.open_until = time.monotonic() + self.cooldown
+                self.trips += 1
+                # start the next window clean so one burst of errors trips the breaker once
+                self.outcomes.clear()
+                print(f"circuit breaker open for {self.cooldown:.0f}s after {failures} failed calls")
+
+    # Seconds left before calls may go through again
+    def wait_time(self):
+        with self.lock:
+            return max(0.0, self.open_until - time.monotonic())
+
+
+class RetryPolicy():
+    # Retries transient API errors with capped exponential backoff and full jitter.
+    # Each attempt gets a short timeout, so a single claim is bounded by roughly
+    # max_attempts * (attempt_timeout + max_delay) rather than one very long hung request.
+    def __init__(self, max_attempts=5, attempt_timeout=120.0, base_delay=1.0, max_delay=30.0, breaker=None):
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.retries = 0
+
+    def backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+        return delay
+
+    def failed(self, attempt, error, stats):
+        # Records a failed attempt and returns the delay before the next one, or None if the error is
+        # final. `stats`, when given, is a dict whose 'retries' entry counts the retries of this call
+        self.breaker.record(False)
+        if not is_retryable(error) or attempt == self.max_attempts - 1:
+            return None
+        self.retries += 1
+        if stats is not None:
+            stats['retries'] = stats.get('retries', 0) + 1
+        delay = self.backoff(attempt, error)
+        print(f"{type(error).__name__}, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_attempts})")
+        return delay
+
+    # Blocking calls; the pipeline's model calls use acall, the Batch API's file and polling calls use this
+    def call(self, fn, kwargs, stats=None):
+        import openai
+
+        kwargs["timeout"] = self.attempt_timeout
+        for attempt in range(self.max_attempts):
+            wait = self.breaker.wait_time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                result = fn(kwargs)
+            except openai.APIError as e:
+                delay = self.failed(attempt, e, stats)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            else:
+                self.breaker.record(True)
+                return result
+
+    async def acall(self, fn, kwargs, stats=None):
+        import openai
+
+        kwargs["timeout"] = self.attempt_timeout
+        for attempt in range(self.max_attempts):
+            wait = self.breaker.wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                result = await fn(kwargs)
+            except openai.APIError as e:
+                delay = self.failed(attempt, e, stats)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record(True)
+                return result
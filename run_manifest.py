@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+import time
+
+
+STAGES = ['generate', 'parse', 'execute', 'verify']
+
+
+class RunManifest():
+    # Append-only JSONL journal recording which stages each claim has completed.
+    # Every line is one finished stage, so a run killed at any point can be resumed from the journal.
+    def __init__(self, path='run_manifest.jsonl', resume=False):
+        self.path = path
+        self.records = {}
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            self.load()
+        elif os.path.exists(path):
+            os.remove(path)
+
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line may be cut short if the previous run was killed mid-write
+                    continue
+                self.records.setdefault(record['key'], {})[record['stage']] = record['data']
+
+    # Record that a claim finished a stage, along with what later stages need to pick up from it
+    def mark(self, key, stage, **data):
+        record = {'key': key, 'stage': stage, 'time': time.time(), 'data': data}
+        with self.lock:
+            self.records.setdefault(key, {})[stage] = data
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def is_done(self, key, stage):
+        return stage in self.records.get(key, {})
+
+    def get(self, key, stage):
+        return self.records.get(key, {}).get(stage)
+
+    def summary(self):
+        return {stage: sum(stage in stages for stages in self.records.values()) for stage in STAGES}
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,41 @@
+import collections
+
+
+class MajorityVote():
+    # Tallies the verdicts of n candidate simulations for one claim. Candidates that could not
+    # produce a verdict abstain. The vote is decided as soon as one verdict holds more than half
+    # of all n candidates, since the remaining ones can no longer change the outcome.
+    def __init__(self, n):
+        self.n = n
+        self.votes = collections.Counter()
+        self.abstained = 0
+        self.first_candidate = {}
+
+    def add(self, candidate, verdict):
+        if verdict is None:
+            self.abstained += 1
+            return
+        self.votes[verdict] += 1
+        self.first_candidate.setdefault(verdict, candidate)
+
+    @property
+    def decided(self):
+        if not self.votes:
+            return None
+        verdict, count = self.votes.most_common(1)[0]
+        return verdict if count > self.n / 2 else None
+
+    def winner(self):
+        # (verdict, candidate) with the most votes, ties going to the verdict reached first; None if all abstained
+        if not self.votes:
+            return None
+        top = max(self.votes.values())
+        for verdict, candidate in self.first_candidate.items():
+            if self.votes[verdict] == top:
+                return verdict, candidate
+
+    def summary(self):
+        parts = [f"{count} {verdict}" for verdict, count in self.votes.most_common()]
+        if self.abstained:
+            parts.append(f"{self.abstained} without a verdict")
+        return ', '.join(parts)
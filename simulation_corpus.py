@@ -0,0 +1,120 @@
+import argparse
+import glob
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from execution_cache import ExecutionCache
+from simulation_runner import run_simulation
+
+
+def script_id(path):
+    # simscripts/simulation_69_5956380.py -> '69_5956380'
+    return re.match(r'simulation_(.*)\.py$', os.path.basename(path)).group(1)
+
+
+# simulation_{id}.py, where id is the claim id with its doc id and sample suffixes; simulation_utils.py,
+# the module the scripts import, is not one of them
+SCRIPT_NAME = re.compile(r'simulation_\d+(?:_\w+)?\.py$')
+
+
+def simulation_scripts(directory):
+    return [path for path in glob.glob(os.path.join(directory, 'simulation_*.py')) if SCRIPT_NAME.match(os.path.basename(path))]
+
+
+def id_order(id):
+    # numeric parts compare as numbers, so 9 comes before 10 and 69_5956380 before 69_14717500
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part) for part in re.split(r'[_\W]+', id)]
+
+
+def run_all(directory='simscripts', workers=None, timeout=60.0, max_output_bytes=1_000_000, cpu_seconds=None,
+            memory_mb=None, use_pool=True, cache=None):
+    # Executes every simulation_{id}.py in directory, at most `workers` at a time, and returns one record
+    # per script ordered by id, whatever order they finished in. With an ExecutionCache, scripts whose
+    # result is cached are not run again.
+    from tqdm import tqdm
+
+    scripts = simulation_scripts(directory)
+    pool = None
+    if use_pool and hasattr(os, 'fork'):
+        from simulation_pool import SimulationPool
+        pool = SimulationPool(directory)
+    run = pool.run if pool is not None else run_simulation
+
+    def execute(path):
+        if cache is not None:
+            result = cache.run(run, path, timeout, max_output_bytes, cpu_seconds, memory_mb)
+        else:
+            result = run(path, timeout, max_output_bytes, cpu_seconds, memory_mb)
+        return {
+            'id': script_id(path),
+            'status': result.status,
+            'exit_code': result.exit_code,
+            'duration': round(result.wall_time, 4),
+            'peak_rss_mb': result.peak_rss_mb,
+            'std_out': result.std_out,
+            'std_err': result.std_err,
+            'cached': result.cached,
+        }
+
+    try:
+        with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+            records = list(tqdm(executor.map(execute, scripts), total=len(scripts)))
+    finally:
+        if pool is not None:
+            pool.close()
+    return sorted(records, key=lambda record: id_order(record['id']))
+
+
+def parquet_engine_missing():
+    # pandas writes Parquet through pyarrow or fastparquet, neither of which is in requirements.txt
+    import importlib.util
+
+    return all(importlib.util.find_spec(engine) is None for engine in ('pyarrow', 'fastparquet'))
+
+
+def write_results(records, path):
+    # JSONL, or Parquet when the path ends in .parquet
+    if path.endswith('.parquet'):
+        import pandas as pd
+
+        pd.DataFrame.from_records(records).to_parquet(path, index=False)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Execute a directory of generated simulations into one results table")
+    parser.add_argument('command', choices=['run-all'])
+    parser.add_argument('directory', nargs='?', default='simscripts')
+    parser.add_argument('--output', default='simulation_results.jsonl', help="results table, .jsonl or .parquet (needs pyarrow)")
+    parser.add_argument('--workers', type=int, default=None, help="simulations running at once (defaults to the CPU count)")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--max-output-bytes', type=int, default=1_000_000)
+    parser.add_argument('--cpu-seconds', type=float, default=30, help="0 for no limit")
+    parser.add_argument('--memory-mb', type=int, default=1024, help="0 for no limit")
+    parser.add_argument('--seed', type=int, default=None, help="PYTHONHASHSEED of the simulations (random by default)")
+    parser.add_argument('--no-cache', action='store_true', help="run every script, even if its cached result is still valid")
+    parser.add_argument('--cache-dir', default='.llm_cache', help="directory holding the execution cache")
+    parser.add_argument('--no-pool', action='store_true', help="start a new interpreter per script instead of forking from the pool")
+    args = parser.parse_args()
+    # checked before the corpus runs, not once it has
+    if args.output.endswith('.parquet') and parquet_engine_missing():
+        parser.error("writing .parquet needs pyarrow or fastparquet (pip install pyarrow), or use a .jsonl --output")
+
+    if args.seed is not None:
+        os.environ['PYTHONHASHSEED'] = str(args.seed)
+    cache = None if args.no_cache else ExecutionCache(args.cache_dir)
+    records = run_all(args.directory, args.workers, args.timeout, args.max_output_bytes, args.cpu_seconds or None,
+                      args.memory_mb or None, not args.no_pool, cache)
+    write_results(records, args.output)
+    if cache is not None:
+        print(f"{cache.hits} of {len(records)} simulations reused from the execution cache, {cache.misses} run")
+        cache.close()
+    statuses = {}
+    for record in records:
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+    print(f"{len(records)} simulations written to {args.output}:", statuses)
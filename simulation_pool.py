@@ -0,0 +1,259 @@
+import argparse
+import filecmp
+import importlib.machinery
+import io
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import types
+
+from simulation_runner import CappedReader, collect_result, kill_process_group, peak_rss_mb, set_resource_limits
+
+
+# what the generated simulations import; imported once by the server instead of once per script
+PRELOAD = ('simulation_utils', 'random', 'numpy')
+
+
+def exit_code(e):
+    # the exit status the interpreter gives an uncaught SystemExit
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def run_script(path):
+    # Executes the script as __main__ the way the interpreter does; runpy.run_path would rewrite sys.argv[0]
+    main = types.ModuleType('__main__')
+    main.__file__ = path
+    main.__loader__ = importlib.machinery.SourceFileLoader('__main__', path)
+    sys.modules['__main__'] = main
+    try:
+        with open(path, 'rb') as f:
+            code = compile(f.read(), path, 'exec')
+        exec(code, main.__dict__)
+    except SystemExit as e:
+        return exit_code(e)
+    except BaseException as e:
+        # start the traceback at the script, as `python script.py` would, leaving out this module
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != path:
+            tb = tb.tb_next
+        # the interpreter's own hook, which adds the "Did you mean" hints that the traceback module leaves out
+        sys.__excepthook__(type(e), e.with_traceback(tb), tb)
+        return 1
+    return 0
+
+
+def drop_stale_preloads(script_dir, preload):
+    # A preloaded module is only reused when the script would import the same source from its own
+    # directory; otherwise it is dropped so the script imports its own copy
+    for name in preload:
+        preloaded = getattr(sys.modules.get(name), '__file__', None)
+        if preloaded is None:
+            continue
+        spec = importlib.machinery.PathFinder.find_spec(name, [script_dir])
+        if spec is not None and spec.origin != preloaded and not filecmp.cmp(spec.origin, preloaded, shallow=False):
+            del sys.modules[name]
+
+
+def run_child(request, std_out, std_err, preload):
+    # In the forked child: become a fresh `python script.py` with the pipes as stdout and stderr. Never returns.
+    os.setsid()
+    set_resource_limits(request.get('cpu_seconds'), request.get('memory_mb'))
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(std_out, 1)
+    os.dup2(std_err, 2)
+    for fd in (devnull, std_out, std_err):
+        os.close(fd)
+    sys.stdin = io.TextIOWrapper(io.FileIO(0, 'r', closefd=False), encoding='utf-8')
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), encoding='utf-8', errors='backslashreplace', line_buffering=True)
+
+    code = 1
+    try:
+        os.chdir(request['cwd'])
+        # the interpreter reports the main script by its absolute path, but keeps argv as given
+        sys.argv = [request['path']]
+        path = os.path.abspath(request['path'])
+        sys.path[0] = os.path.dirname(path)
+        drop_stale_preloads(sys.path[0], preload)
+        code = run_script(path)
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+        os._exit(code)
+
+
+def reap(replies):
+    # Sends the exit code and peak RSS of every finished child to whoever asked for it
+    while replies:
+        try:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        reply = replies.pop(pid, None)
+        if reply is not None:
+            try:
+                reply.sendall(f"{os.waitstatus_to_exitcode(status)} {usage.ru_maxrss}\n".encode())
+            except OSError:
+                pass
+            reply.close()
+
+
+def serve(control_fd, preload_dir, preload):
+    # The server process: imports the preload modules, then forks a child per request until its stdin closes.
+    # A request carries the script and working directory, plus the stdout, stderr and reply fds.
+    sys.path[0] = os.path.abspath(preload_dir)
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+    control = socket.socket(fileno=control_fd)
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    replies = {}
+    while True:
+        try:
+            readable, _, _ = select.select([sys.stdin, control, wakeup_r], [], [])
+        except InterruptedError:
+            continue
+        if sys.stdin in readable and not os.read(sys.stdin.fileno(), 4096):
+            break
+        if wakeup_r in readable:
+            os.read(wakeup_r, 4096)
+        if control in readable:
+            message, fds, _, _ = socket.recv_fds(control, 65536, 3)
+            std_out, std_err, reply_fd = fds
+            pid = os.fork()
+            if pid == 0:
+                signal.set_wakeup_fd(-1)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                for fd in (control.detach(), wakeup_r, wakeup_w, reply_fd):
+                    os.close(fd)
+                for reply in replies.values():
+                    reply.close()
+                run_child(json.loads(message), std_out, std_err, preload)
+            os.close(std_out)
+            os.close(std_err)
+            reply = socket.socket(fileno=reply_fd)
+            try:
+                reply.sendall(f"{pid}\n".encode())
+            except OSError:
+                pass
+            replies[pid] = reply
+        reap(replies)
+
+
+class SimulationPool():
+    # Runs simulations in children forked from a server process that has already imported
+    # simulation_utils (and random, numpy), so a run skips interpreter startup and those imports.
+    # Every script still gets a fresh process of its own, so runs can't affect each other. POSIX only.
+    def __init__(self, preload_dir='simscripts', preload=PRELOAD):
+        if not hasattr(os, 'fork') or not hasattr(socket, 'send_fds'):
+            raise RuntimeError("the simulation pool needs fork and fd passing (POSIX, Python 3.9+)")
+        self.control, server_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # the children must not start a BLAS thread pool per fork
+        env = dict(os.environ, PYTHONIOENCODING='utf-8', OPENBLAS_NUM_THREADS='1', OMP_NUM_THREADS='1', MKL_NUM_THREADS='1')
+        self.server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(server_end.fileno()),
+                                        '--preload-dir', preload_dir, '--preload', *preload],
+                                       stdin=subprocess.PIPE, pass_fds=(server_end.fileno(),), env=env)
+        server_end.close()
+        self.lock = threading.Lock()
+
+    def run(self, code_filepath, timeout=60.0, max_output_bytes=1_000_000, cpu_seconds=None, memory_mb=None, cancellation=None):
+        # Same contract as simulation_runner.run_simulation
+        start = time.perf_counter()
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        reply, reply_child = socket.socketpair()
+        request = json.dumps({'path': code_filepath, 'cwd': os.getcwd(), 'cpu_seconds': cpu_seconds, 'memory_mb': memory_mb}).encode()
+        try:
+            with self.lock:
+                socket.send_fds(self.control, [request], [out_w, err_w, reply_child.fileno()])
+        finally:
+            os.close(out_w)
+            os.close(err_w)
+            reply_child.close()
+
+        lines = LineReader(reply)
+        pid = int(lines.next(None))
+        if cancellation is not None:
+            cancellation.started(pid, lambda: kill_process_group(pid))
+        readers = [CappedReader(os.fdopen(out_r, 'rb'), max_output_bytes, lambda: kill_process_group(pid)),
+                   CappedReader(os.fdopen(err_r, 'rb'), max_output_bytes, lambda: kill_process_group(pid))]
+        for reader in readers:
+            reader.start()
+
+        timed_out = False
+        try:
+            code, maxrss = lines.next(timeout).split()
+        except TimeoutError:
+            kill_process_group(pid)
+            timed_out = True
+            code, maxrss = lines.next(None).split()
+        reply.close()
+        cancelled = cancellation is not None and cancellation.finished(pid)
+        return collect_result(readers, None if timed_out else int(code), time.perf_counter() - start, timeout if timed_out else None,
+                              max_output_bytes, cpu_seconds, memory_mb, peak_rss_mb(int(maxrss)), cancelled)
+
+    def close(self):
+        self.control.close()
+        if self.server.stdin is not None:
+            self.server.stdin.close()
+        self.server.wait()
+
+
+class LineReader():
+    # Newline-terminated messages from the server, with an optional timeout per message
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+
+    def next(self, timeout):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while b'\n' not in self.buffer:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                self.sock.settimeout(remaining)
+            else:
+                self.sock.settimeout(None)
+            try:
+                chunk = self.sock.recv(4096)
+            except socket.timeout:
+                raise TimeoutError from None
+            if not chunk:
+                raise RuntimeError("the simulation pool server has exited")
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line.decode()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Server process of SimulationPool, started by the pool itself")
+    parser.add_argument('--serve', type=int, required=True, help="fd of the control socket")
+    parser.add_argument('--preload-dir', default='simscripts')
+    parser.add_argument('--preload', nargs='*', default=list(PRELOAD))
+    args = parser.parse_args()
+    serve(args.serve, args.preload_dir, args.preload)
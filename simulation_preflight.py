@@ -0,0 +1,242 @@
+import ast
+import builtins
+import functools
+import os
+import sys
+
+
+BUILTIN_NAMES = set(dir(builtins)) | {'__file__', '__builtins__'}
+
+# printed as the first line of std_err when a simulation is not run because it failed the pre-flight check
+PREFLIGHT_HEADER = "Pre-flight check failed, the simulation was not run:"
+
+
+class BindingCollector(ast.NodeVisitor):
+    # Every name bound anywhere in a module and every name it loads, ignoring scopes: a name loaded
+    # in one function and bound in another is treated as defined, so only names bound nowhere are free
+    def __init__(self):
+        self.bound = set()
+        self.loaded = {}
+        self.star_imports = []
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.loaded.setdefault(node.id, node.lineno)
+        else:
+            self.bound.add(node.id)
+
+    def visit_FunctionDef(self, node):
+        self.bound.add(node.name)
+        args = node.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                self.bound.add(arg.arg)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        args = node.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                self.bound.add(arg.arg)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.bound.add(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                self.star_imports.append(node.module)
+            else:
+                self.bound.add(alias.asname or alias.name)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.bound.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchStar(self, node):
+        if node.name:
+            self.bound.add(node.name)
+
+    def visit_MatchMapping(self, node):
+        if node.rest:
+            self.bound.add(node.rest)
+        self.generic_visit(node)
+
+
+def self_attribute_uses(cls):
+    # (attribute, lineno, stored) for every self.<attribute> in the class's methods
+    uses = []
+    for method in cls.body:
+        if not isinstance(method, (ast.FunctionDef, ast.AsyncFunctionDef)) or not method.args.args:
+            continue
+        self_name = method.args.args[0].arg
+        for node in ast.walk(method):
+            if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == self_name:
+                uses.append((node.attr, node.lineno, not isinstance(node.ctx, ast.Load)))
+    return uses
+
+
+def class_attributes(cls):
+    # attributes a class defines itself: methods, class-level assignments and self.<attribute> = ... in any method
+    attributes = set()
+    for node in cls.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            attributes.add(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            for target in (node.targets if isinstance(node, ast.Assign) else [node.target]):
+                attributes.update(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+    attributes.update(attribute for attribute, _, stored in self_attribute_uses(cls) if stored)
+    return attributes
+
+
+def module_classes(tree):
+    # class name -> (base names, own attributes) for the module's top-level classes
+    classes = {}
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            bases = [base.id if isinstance(base, ast.Name) else None for base in node.bases]
+            classes[node.name] = (bases, class_attributes(node))
+    return classes
+
+
+@functools.lru_cache(maxsize=None)
+def template_exports(path='simulation_utils.py'):
+    # Top-level names and classes of the simulation template, read without importing it
+    if not os.path.exists(path):
+        return frozenset(), {}
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(n.id for target in node.targets for n in ast.walk(target) if isinstance(n, ast.Name))
+    return frozenset(names), module_classes(tree)
+
+
+def hierarchy_attributes(name, classes, seen=None):
+    # All attributes available on instances of `name`, or None when a base is unknown (e.g. a library class)
+    seen = seen or set()
+    if name in seen or name not in classes:
+        return None
+    seen.add(name)
+    bases, attributes = classes[name]
+    attributes = set(attributes)
+    for base in bases:
+        if base == 'object':
+            continue
+        inherited = hierarchy_attributes(base, classes, seen) if base is not None else None
+        if inherited is None:
+            return None
+        attributes |= inherited
+    return attributes
+
+
+def unresolved_attributes(tree, template_classes):
+    # self.<attribute> loads that no class in the hierarchy (or any subclass, for base-class hooks) ever defines
+    source_classes = {**template_classes, **module_classes(tree)}
+    subclasses = {}
+    for name, (bases, _) in source_classes.items():
+        for base in bases:
+            subclasses.setdefault(base, set()).add(name)
+
+    def descendant_attributes(name):
+        attributes = set()
+        for child in subclasses.get(name, ()):
+            attributes |= source_classes[child][1] | descendant_attributes(child)
+        return attributes
+
+    problems = []
+    for cls in (node for node in tree.body if isinstance(node, ast.ClassDef)):
+        attributes = hierarchy_attributes(cls.name, source_classes)
+        if attributes is None or {'__getattr__', '__getattribute__'} & attributes:
+            continue
+        attributes |= descendant_attributes(cls.name)
+        for attribute, lineno, stored in self_attribute_uses(cls):
+            if not stored and attribute not in attributes and not attribute.startswith('__'):
+                problems.append(f"line {lineno}: '{cls.name}' object has no attribute '{attribute}'")
+    return problems
+
+
+class PreflightReport():
+    # Outcome of checking one generated simulation: the (possibly fixed) code, the imports that
+    # were added to it, and the errors that would make it fail at runtime
+    def __init__(self, code, added_imports=None, errors=None):
+        self.code = code
+        self.added_imports = added_imports or []
+        self.errors = errors or []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __str__(self):
+        lines = [PREFLIGHT_HEADER] if self.errors else []
+        lines += self.errors + [f"added: {line}" for line in self.added_imports]
+        return '\n'.join(lines)
+
+
+def insert_imports(code, tree, imports):
+    # after the module docstring and any __future__ imports, so the result still compiles
+    lineno = 0
+    for node in tree.body:
+        is_docstring = isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        if (is_docstring and node is tree.body[0]) or (isinstance(node, ast.ImportFrom) and node.module == '__future__'):
+            lineno = node.end_lineno
+        else:
+            break
+    lines = code.splitlines(keepends=True)
+    return ''.join(lines[:lineno] + [line + '\n' for line in imports] + lines[lineno:])
+
+
+def preflight(code, template_path='simulation_utils.py'):
+    # Compile the code, import free names that simulation_utils or the standard library provide,
+    # and report the names and self attributes that nothing defines
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return PreflightReport(code, errors=[f"line {e.lineno}: SyntaxError: {e.msg}"])
+
+    template_names, template_classes = template_exports(template_path)
+    collector = BindingCollector()
+    collector.visit(tree)
+    if 'simulation_utils' in collector.star_imports:
+        collector.bound |= template_names
+        collector.star_imports.remove('simulation_utils')
+
+    imports = []
+    errors = []
+    for name, lineno in sorted(collector.loaded.items(), key=lambda item: item[1]):
+        if name in collector.bound or name in BUILTIN_NAMES:
+            continue
+        if name in template_names:
+            imports.append(f"from simulation_utils import {name}")
+        elif name in sys.stdlib_module_names:
+            imports.append(f"import {name}")
+        elif not collector.star_imports:
+            errors.append(f"line {lineno}: NameError: name '{name}' is not defined")
+
+    errors += unresolved_attributes(tree, template_classes)
+    if imports:
+        code = insert_imports(code, tree, imports)
+    return PreflightReport(code, imports, errors)
@@ -0,0 +1,91 @@
+import re
+
+from simulation_preflight import PREFLIGHT_HEADER
+
+
+EDIT_BLOCK = re.compile(r'<<<<<<< SEARCH\n(.*?)\n?=======\n(.*?)\n?>>>>>>> REPLACE', re.DOTALL)
+
+
+def simulation_failed(std_err):
+    # a traceback, a syntax error (reported without one) or a pre-flight failure; warnings don't count
+    return 'Traceback' in std_err or std_err.startswith(PREFLIGHT_HEADER) or re.search(r'^\w*Error:', std_err, re.MULTILINE) is not None
+
+
+def file_name(path):
+    # tracebacks recorded on Windows use backslashes
+    return re.split(r'[\\/]', path)[-1]
+
+
+def trim_traceback(std_err, max_lines=20):
+    # The frames inside the generated script and the exception itself; interpreter and library
+    # frames, and the directories of every path, are noise to the model
+    if std_err.startswith(PREFLIGHT_HEADER):
+        return std_err
+    lines = std_err.rstrip().splitlines()
+    kept = []
+    skip_source = False
+    for line in lines:
+        frame = re.match(r'\s*File "(.*?)", (line \d+.*)', line)
+        if frame:
+            skip_source = not file_name(frame.group(1)).startswith('simulation_')
+            if not skip_source:
+                kept.append(f'  File "{file_name(frame.group(1))}", {frame.group(2)}')
+            continue
+        if line.startswith('Traceback'):
+            kept.append(line)
+            skip_source = False
+        elif line.startswith(' ') and (skip_source or set(line.strip()) <= set('^~ ')):
+            continue
+        else:
+            kept.append(line)
+    if len(kept) > max_lines:
+        kept = kept[:1] + ['  ...'] + kept[-(max_lines - 2):]
+    return '\n'.join(kept)
+
+
+def make_repair_prompt(claim, code, error):
+    system_prompt = """
+        You are fixing a Python simulation script that failed when it was run.
+        Make the smallest change that fixes the error. Do not rewrite the script, rename things or change what it simulates.
+
+        Answer with one or more edits in exactly this form:
+        <<<<<<< SEARCH
+        lines copied exactly from the script
+        =======
+        the lines that replace them
+        >>>>>>> REPLACE
+
+        Each SEARCH part must match the script exactly, including indentation, and appear in it only once.
+        To add new code, SEARCH for a nearby line and REPLACE it with that line plus the new code.
+        The script may import GameObject and Container from simulation_utils; nothing else is available besides the standard library.
+    """
+
+    user_prompt = f"""
+        The script was written to test this claim: {claim}
+
+        Script:
+        ```python
+{code}
+        ```
+
+        Error:
+        {error}
+
+        Please give your edits now
+    """
+    return system_prompt, user_prompt
+
+
+def apply_repair(code, reply):
+    # The patched script, or None if the reply holds no edit that applies cleanly.
+    # A reply with a whole script in a code block instead of edits replaces the script.
+    edits = EDIT_BLOCK.findall(reply)
+    if not edits:
+        blocks = re.findall(r'```(?:python)?\n(.*?)```', reply, re.DOTALL)
+        return blocks[0] if blocks and blocks[0].strip() else None
+
+    for search, replace in edits:
+        if not search.strip() or code.count(search) != 1:
+            return None
+        code = code.replace(search, replace)
+    return code
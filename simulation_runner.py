@@ -0,0 +1,289 @@
+import math
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows: the CPU and memory limits are not enforced
+    resource = None
+
+
+# Appended to std_err when a simulation is stopped by one of its limits; simulation_failed treats both as errors
+TIMEOUT_MESSAGE = "TimeoutError: the simulation was killed after {:g}s without finishing"
+RESOURCE_MESSAGE = "ResourceError: the simulation was stopped for exceeding its {}"
+TRUNCATED_MESSAGE = "\n[output truncated after {} bytes]\n"
+
+LIMIT_LINE = re.compile(r'^(?:TimeoutError: the simulation was killed|ResourceError: the simulation was stopped).*$', re.MULTILINE)
+
+
+def stopped_by_limit(std_err):
+    # the line saying which limit stopped the simulation, or None if it ran to the end
+    match = LIMIT_LINE.search(std_err or '')
+    return match.group(0) if match else None
+
+
+def limit_status(std_err):
+    # The status ('timeout' or 'resource_exceeded') of a run stopped by one of its limits, read back from
+    # the line collect_result appended to its std_err, so it survives the manifest, the cache and repairs;
+    # None if the run was not stopped
+    line = stopped_by_limit(std_err)
+    if line is None:
+        return None
+    return 'timeout' if line.startswith('TimeoutError') else 'resource_exceeded'
+
+
+class SimulationResult():
+    # Outcome of one simulation process. exit_code is None when it was killed on timeout, and
+    # exceeded names the resource limit ('output', 'cpu' or 'memory') that stopped it, if any.
+    # cancelled is set when it was killed through its Cancellation. peak_rss_mb is None where the
+    # platform doesn't report it.
+    def __init__(self, std_out, std_err, exit_code, wall_time, timed_out=False, truncated=False, exceeded=None, peak_rss_mb=None,
+                 cancelled=False):
+        self.std_out = std_out
+        self.std_err = std_err
+        self.exit_code = exit_code
+        self.wall_time = wall_time
+        self.timed_out = timed_out
+        self.truncated = truncated
+        self.exceeded = exceeded
+        self.peak_rss_mb = peak_rss_mb
+        self.cancelled = cancelled
+        # set by ExecutionCache when the result is reused instead of run
+        self.cached = False
+
+    @property
+    def status(self):
+        if self.cancelled:
+            return 'cancelled'
+        if self.timed_out:
+            return 'timeout'
+        if self.exceeded is not None:
+            return 'resource_exceeded'
+        return 'ok' if self.exit_code == 0 else f'exit_{self.exit_code}'
+
+
+class CappedReader(threading.Thread):
+    # Reads a pipe to the end, keeping only the first max_bytes. on_overflow is called once when
+    # the cap is first exceeded, to stop the writer; the rest is drained so it never blocks on a full pipe
+    def __init__(self, pipe, max_bytes, on_overflow=None):
+        super().__init__(daemon=True)
+        self.pipe = pipe
+        self.max_bytes = max_bytes
+        self.on_overflow = on_overflow
+        self.chunks = []
+        self.size = 0
+        self.truncated = False
+
+    def run(self):
+        for chunk in iter(lambda: self.pipe.read1(65536), b''):
+            kept = chunk[:max(self.max_bytes - self.size, 0)]
+            if kept:
+                self.chunks.append(kept)
+                self.size += len(kept)
+            if len(kept) < len(chunk) and not self.truncated:
+                self.truncated = True
+                if self.on_overflow is not None:
+                    self.on_overflow()
+        self.pipe.close()
+
+    def text(self):
+        text = b''.join(self.chunks).decode('utf-8', errors='replace')
+        return text + TRUNCATED_MESSAGE.format(self.max_bytes) if self.truncated else text
+
+
+def kill_process_group(pid):
+    # the script may have started children of its own; they share its process group
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # killed before it had started its own session
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    except PermissionError:
+        pass
+
+
+def kill_process(process):
+    if hasattr(os, 'killpg'):
+        kill_process_group(process.pid)
+    else:
+        process.kill()
+
+
+def resource_limits(cpu_seconds=None, memory_mb=None):
+    # (resource, (soft, hard)) pairs for the limits that are set. Past the CPU limit the kernel sends
+    # SIGXCPU, and SIGKILL a second later; past the memory limit allocations fail with MemoryError.
+    limits = []
+    if cpu_seconds:
+        limits.append((resource.RLIMIT_CPU, (math.ceil(cpu_seconds), math.ceil(cpu_seconds) + 1)))
+    if memory_mb:
+        limits.append((resource.RLIMIT_AS, (memory_mb * 1024 * 1024, memory_mb * 1024 * 1024)))
+    return limits
+
+
+class Cancellation():
+    # Calls off a group of simulations that are no longer needed, e.g. the candidates of a claim whose
+    # vote is decided. cancel() kills the ones running, and any started afterwards is killed at once.
+    def __init__(self):
+        self.cancelled = False
+        self.running = {}
+        self.killed = set()
+        self.lock = threading.Lock()
+
+    def started(self, pid, kill):
+        with self.lock:
+            self.running[pid] = kill
+            if self.cancelled:
+                self.killed.add(pid)
+            cancelled = self.cancelled
+        if cancelled:
+            kill()
+
+    def finished(self, pid):
+        # True if the simulation was killed by cancel()
+        with self.lock:
+            self.running.pop(pid, None)
+            return pid in self.killed
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            running = list(self.running.items())
+            self.killed.update(pid for pid, _ in running)
+        for _, kill in running:
+            kill()
+
+
+def set_resource_limits(cpu_seconds=None, memory_mb=None):
+    # In the simulation's own process, before the script runs (the pool's forked children)
+    if resource is None:
+        return
+    for limit, values in resource_limits(cpu_seconds, memory_mb):
+        resource.setrlimit(limit, values)
+
+
+def limit_process(pid, cpu_seconds=None, memory_mb=None):
+    # From outside an already started simulation, right after the spawn. Setting them in a preexec_fn
+    # instead would be unsafe in the worker threads simulations run in, and would turn off subprocess's
+    # vfork fast path. A process that has already exited has nothing left to limit.
+    for limit, values in resource_limits(cpu_seconds, memory_mb):
+        try:
+            resource.prlimit(pid, limit, values)
+        except ProcessLookupError:
+            return
+
+
+# Where resource.prlimit is missing (macOS), the simulation's interpreter sets the limits on itself and
+# then runs the script as __main__, with the sys.argv and sys.path[0] of `python script.py`
+LIMITS_BOOTSTRAP = """
+import math, os, resource, runpy, sys
+cpu_seconds, memory_mb, path = float(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+if cpu_seconds:
+    resource.setrlimit(resource.RLIMIT_CPU, (math.ceil(cpu_seconds), math.ceil(cpu_seconds) + 1))
+if memory_mb:
+    resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, memory_mb * 1024 * 1024))
+sys.argv = [path]
+sys.path[0] = os.path.dirname(os.path.abspath(path))
+runpy.run_path(path, run_name='__main__')
+"""
+
+
+def simulation_command(code_filepath, cpu_seconds=None, memory_mb=None):
+    # The command line that runs the script, and whether its limits still have to be set with limit_process
+    limited = resource is not None and bool(cpu_seconds or memory_mb)
+    if limited and not hasattr(resource, 'prlimit'):
+        return [sys.executable, '-c', LIMITS_BOOTSTRAP, str(cpu_seconds or 0), str(memory_mb or 0), code_filepath], False
+    return [sys.executable, code_filepath], limited
+
+
+def exceeded_limit(exit_code, std_err, truncated, cpu_seconds=None, memory_mb=None):
+    if truncated:
+        return 'output'
+    if cpu_seconds and exit_code in (-getattr(signal, 'SIGXCPU', 0), -signal.SIGKILL):
+        return 'cpu'
+    if memory_mb and exit_code != 0 and re.match(r'MemoryError\b', (std_err.rstrip().splitlines() or [''])[-1]):
+        return 'memory'
+    return None
+
+
+def peak_rss_mb(maxrss):
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def wait(process, timeout):
+    # Like process.wait, but kills the process group once the timeout passes, and reaps the child
+    # with wait4 so its peak RSS is known. Returns (exit code, peak RSS in MB or None, timed out).
+    if not hasattr(os, 'wait4'):
+        try:
+            return process.wait(timeout), None, False
+        except subprocess.TimeoutExpired:
+            kill_process(process)
+            return process.wait(), None, True
+    reaped = []
+    waiter = threading.Thread(target=lambda: reaped.append(os.wait4(process.pid, 0)), daemon=True)
+    waiter.start()
+    waiter.join(timeout)
+    timed_out = waiter.is_alive()
+    if timed_out:
+        kill_process(process)
+        waiter.join()
+    _, status, usage = reaped[0]
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, peak_rss_mb(usage.ru_maxrss), timed_out
+
+
+def run_simulation(code_filepath, timeout=60.0, max_output_bytes=1_000_000, cpu_seconds=None, memory_mb=None, cancellation=None):
+    # Runs a script with the current interpreter, without a shell, and captures its output in memory
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    command, limit_after_spawn = simulation_command(code_filepath, cpu_seconds, memory_mb)
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=env, start_new_session=True)
+    if limit_after_spawn:
+        limit_process(process.pid, cpu_seconds, memory_mb)
+    if cancellation is not None:
+        cancellation.started(process.pid, lambda: kill_process(process))
+    readers = [CappedReader(process.stdout, max_output_bytes, lambda: kill_process(process)),
+               CappedReader(process.stderr, max_output_bytes, lambda: kill_process(process))]
+    for reader in readers:
+        reader.start()
+
+    exit_code, peak_rss, timed_out = wait(process, timeout)
+    cancelled = cancellation is not None and cancellation.finished(process.pid)
+    return collect_result(readers, None if timed_out else exit_code, time.perf_counter() - start, timeout if timed_out else None,
+                          max_output_bytes, cpu_seconds, memory_mb, peak_rss, cancelled)
+
+
+def collect_result(readers, exit_code, wall_time, timed_out_after=None, max_output_bytes=None, cpu_seconds=None, memory_mb=None,
+                   peak_rss=None, cancelled=False):
+    # Waits for the stdout and stderr readers and builds the result; timed_out_after is the timeout that was hit, if any
+    for reader in readers:
+        # a grandchild that escaped the process group could hold the pipes open
+        reader.join(timeout=1.0)
+
+    std_out, std_err = (reader.text() for reader in readers)
+    truncated = any(reader.truncated for reader in readers)
+    if cancelled:
+        # killed on purpose, not by one of its limits
+        return SimulationResult(std_out, std_err, exit_code, wall_time, truncated=truncated, peak_rss_mb=peak_rss, cancelled=True)
+    exceeded = None if timed_out_after is not None else exceeded_limit(exit_code, std_err, truncated, cpu_seconds, memory_mb)
+    if timed_out_after is not None:
+        message = TIMEOUT_MESSAGE.format(timed_out_after)
+    elif exceeded is not None:
+        limit = {'output': f"output limit of {max_output_bytes} bytes", 'cpu': f"CPU time limit of {cpu_seconds:g}s",
+                 'memory': f"memory limit of {memory_mb} MB"}[exceeded]
+        message = RESOURCE_MESSAGE.format(limit)
+    else:
+        message = None
+    if message is not None:
+        std_err += ('\n' if std_err and not std_err.endswith('\n') else '') + message + '\n'
+    return SimulationResult(std_out, std_err, exit_code, wall_time, timed_out_after is not None, truncated, exceeded, peak_rss)
@@ -0,0 +1,54 @@
+import re
+import time
+
+
+# same pattern parse_gpt_response extracts the simulation with
+CODE_BLOCK_PATTERN = re.compile(r'```(.*?)```', re.DOTALL)
+
+
+class CodeBlockStream():
+    # Accumulates streamed content and reports when the first fenced code block has been closed,
+    # at which point the rest of the completion (usually prose about the code) can be dropped.
+    def __init__(self):
+        self.text = ''
+        self.usage = None
+        self.model = None
+        self.stopped_early = False
+
+    # Add a streamed chunk; returns True once the code block is complete
+    def feed(self, chunk):
+        if self.model is None:
+            self.model = chunk.model
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            # only the newest part can close the block, so look for a fence from just before it
+            tail_start = max(0, len(self.text) - 2)
+            self.text += chunk.choices[0].delta.content
+            if '```' in self.text[tail_start:]:
+                match = CODE_BLOCK_PATTERN.search(self.text)
+                if match:
+                    self.text = self.text[:match.end()]
+                    self.stopped_early = True
+                    return True
+        return False
+
+    # The streamed text as a ChatCompletion, with usage estimated if the stream was cut before it arrived
+    def completion(self, kwargs, count_tokens, estimate_prompt_tokens):
+        from openai.types.chat import ChatCompletion
+        from openai.types.completion_usage import CompletionUsage
+
+        usage = self.usage
+        if usage is None:
+            prompt_tokens = estimate_prompt_tokens(kwargs['messages'], kwargs['model'])
+            completion_tokens = count_tokens(self.text)
+            usage = CompletionUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                    total_tokens=prompt_tokens + completion_tokens)
+        return ChatCompletion(
+            id=f'stream-{time.time_ns()}',
+            object='chat.completion',
+            created=int(time.time()),
+            model=self.model or kwargs['model'],
+            choices=[{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': self.text}}],
+            usage=usage,
+        )
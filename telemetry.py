@@ -0,0 +1,127 @@
+import argparse
+import json
+import threading
+import time
+
+
+# USD per million tokens: (input, cached input, output). Batch API calls are billed at half these rates.
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1': (2.00, 0.50, 8.00),
+}
+
+
+def model_prices(model):
+    # dated snapshots such as gpt-4o-mini-2024-07-18 are priced like their base model
+    return next((PRICES[name] for name in sorted(PRICES, key=len, reverse=True) if model and model.startswith(name)), None)
+
+
+def call_cost(model, prompt_tokens, completion_tokens, cached_tokens=0, batch=False):
+    prices = model_prices(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    cost = ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1e6
+    return cost / 2 if batch else cost
+
+
+class Telemetry():
+    # JSONL sink with one record per LLM call, parse and simulation run. Records from one
+    # process share a run_id so the summary can report on a single run.
+    def __init__(self, path='telemetry.jsonl'):
+        self.path = path
+        self.run_id = time.strftime('%Y%m%d-%H%M%S')
+        self.file = None
+        self.lock = threading.Lock()
+
+    def record(self, claim_id, stage, wall_time, status='ok', model=None, usage=None, retries=0, batch=False, **extra):
+        record = {
+            'run_id': self.run_id,
+            'time': time.time(),
+            'claim_id': str(claim_id) if claim_id is not None else None,
+            'stage': stage,
+            'model': model,
+            'prompt_tokens': None,
+            'completion_tokens': None,
+            'cached_tokens': None,
+            'cost': None,
+            'wall_time': wall_time,
+            'retries': retries,
+            'batch': batch,
+            'status': status,
+        }
+        if usage is not None:
+            details = usage.prompt_tokens_details
+            record['prompt_tokens'] = usage.prompt_tokens
+            record['completion_tokens'] = usage.completion_tokens
+            record['cached_tokens'] = (details.cached_tokens or 0) if details is not None else 0
+            record['cost'] = call_cost(model, usage.prompt_tokens, usage.completion_tokens, record['cached_tokens'], batch)
+        record.update(extra)
+
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def summarize(path='telemetry.jsonl', run_id=None):
+    import pandas as pd
+
+    records = pd.read_json(path, lines=True)
+    if records.empty:
+        return records
+    if run_id is None:
+        run_id = records['run_id'].iloc[-1]
+    if run_id != 'all':
+        records = records[records['run_id'] == run_id]
+
+    # batched calls have no per-request latency, so they only count towards tokens and cost
+    latency = records['wall_time'].astype(float)
+    # streamed generations cut off once their code block closed (--stream); older records lack the field
+    stopped_early = records['stopped_early'].fillna(False).astype(bool) if 'stopped_early' in records else False
+    records = records.assign(latency=latency, failed=~records['status'].isin(['ok', 'cache_hit', 'local']), stopped_early=stopped_early)
+    summary = records.groupby('stage').agg(
+        calls=('stage', 'size'),
+        failed=('failed', 'sum'),
+        retries=('retries', 'sum'),
+        p50=('latency', lambda x: x.quantile(0.50)),
+        p95=('latency', lambda x: x.quantile(0.95)),
+        p99=('latency', lambda x: x.quantile(0.99)),
+        total_time=('latency', 'sum'),
+        prompt_tokens=('prompt_tokens', 'sum'),
+        completion_tokens=('completion_tokens', 'sum'),
+        cached_tokens=('cached_tokens', 'sum'),
+        cost=('cost', 'sum'),
+        # simulations stopped by their timeout or a resource limit (also counted as failed)
+        stopped=('status', lambda x: x.isin(['timeout', 'resource_exceeded']).sum()),
+        stopped_early=('stopped_early', 'sum'),
+    )
+    summary.attrs['run_id'] = run_id
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarize pipeline telemetry per stage")
+    parser.add_argument('command', choices=['summary'])
+    parser.add_argument('path', nargs='?', default='telemetry.jsonl')
+    parser.add_argument('--run', default=None, help="run_id to summarize (defaults to the latest run, 'all' for every run)")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    summary = summarize(args.path, args.run)
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', None)
+    print(f"run {summary.attrs.get('run_id')}: latency in seconds, cost in USD")
+    print(summary.round(4))
+    print(f"total cost: ${summary['cost'].sum():.4f}")
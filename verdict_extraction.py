@@ -0,0 +1,47 @@
+import re
+
+
+# a line that opens with a verdict, optionally behind a label: "Supported: ...", "Claim is Refuted: ...",
+# "Claim verification result: Supported", "Result: Supported - ...", "The claim is supported: ..."
+VERDICT_LINE = re.compile(
+    r'^\W*(?:(?:the\s+)?claim(?:\s+(?:is|verification|evaluation|status))?(?:\s+result)?|(?:verification\s+)?result|verdict|conclusion)?'
+    r'\s*[:\-]?\s*(supported|refuted)\b',
+    re.IGNORECASE)
+
+# structured result lines: verification_result: Supported, "verification_result": "Refuted"
+STRUCTURED_LINE = re.compile(r'verification_result["\']?\s*[:=]\s*["\']?(supported|refuted)\b', re.IGNORECASE)
+
+
+def words(text):
+    return set(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def restates_claim(statement, claim, min_overlap=0.9):
+    # Simulations often print their own paraphrase after the verdict, and sometimes it is a different
+    # (even opposite) proposition; the verdict only counts when the statement covers the claim's words
+    statement = statement.strip(' :-.\t')
+    if not statement or claim is None:
+        return True
+    claim_words = words(claim)
+    return not claim_words or len(claim_words & words(statement)) / len(claim_words) >= min_overlap
+
+
+def extract_verdict(std_out, std_err='', claim=None):
+    # Return (verification_result, evidence line) when the simulation states one verdict about
+    # this claim unambiguously, or None when it errored, said nothing, printed conflicting
+    # verdicts or gave its verdict on a differently worded statement
+    if not std_out or not std_out.strip() or 'Traceback' in (std_err or ''):
+        return None
+
+    verdicts = []
+    for line in std_out.splitlines():
+        match = VERDICT_LINE.match(line)
+        if match and not restates_claim(line[match.end():], claim):
+            return None
+        match = match or STRUCTURED_LINE.search(line)
+        if match:
+            verdicts.append((match.group(1).capitalize(), line.strip()))
+
+    if not verdicts or len({verdict for verdict, _ in verdicts}) > 1:
+        return None
+    return verdicts[-1]
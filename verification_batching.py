@@ -0,0 +1,146 @@
+import asyncio
+import json
+import re
+
+from verification_results import VERIFICATION_SCHEMA
+
+
+BATCH_VERIFICATION_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'batch_verification',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                'results': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'id': {'type': 'string'},
+                            'verification_result': VERIFICATION_SCHEMA['properties']['verification_result'],
+                            'reason': {'type': 'string'},
+                        },
+                        'required': ['id', 'verification_result', 'reason'],
+                        'additionalProperties': False,
+                    },
+                },
+            },
+            'required': ['results'],
+            'additionalProperties': False,
+        },
+    },
+}
+
+
+def make_batch_verification_prompt(items):
+    # items are (claim, sim_output) pairs, labelled c1..cN in the prompt
+    system_prompt = """
+        You are a scientific claim inspector, who can catch fake claims accurately and verify correct claims efficiently.
+        Your main responsibility is to look at the outputs of simulations.
+        Each simulation was run with the elements relevant to its claim, and it displays a output that can give you details of the veraicity of that claim.
+
+        Inspect each output and understand its claim, to verify if the claim is supported or refuted.
+
+        You will be given several numbered items, each with:
+        1. A Claim
+        2. The output of a Simulation that can be used to help verify the claim.
+
+        Your output will be a JSON object with one result per item, in this form:
+        {
+            "results": [
+                {
+                    "id": the item id as given (e.g. "c1"),
+                    "verification_result": "Supported" or "Refuted" or null if you are unable to verify the claim,
+                    "reason": reason of the verification result, or reason of the null output
+                }
+            ]
+        }
+    """
+
+    item_texts = []
+    for n, (claim, sim_output) in enumerate(items, start=1):
+        item_texts.append(f"""
+        Item c{n}
+        Claim: {claim}
+        Simulation Output: {sim_output}
+        """)
+
+    user_prompt = ''.join(item_texts) + """
+
+        Rules for the output:
+        1. Give exactly one result for every item id.
+        2. If a verification_result is null, make sure to include the reason as to why you were note able to determine the result
+        3. A verification result should only be null if the simulation output is an execution error, otherwise you should provide a definite result and a definite reason.
+
+        Please generate your verification results now
+    """
+    return system_prompt, user_prompt
+
+
+# Map each item label (c1..cN) to its verdict dict; raises ValueError when the reply is not usable
+def parse_batch_verification(content, count):
+    fenced = re.findall(r'```(?:json)?(.*?)```', content, re.DOTALL)
+    if fenced:
+        content = fenced[0]
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"batched verification is not valid JSON: {e}")
+
+    results = parsed.get('results') if isinstance(parsed, dict) else parsed
+    if not isinstance(results, list):
+        raise ValueError("batched verification has no list of results")
+
+    verdicts = {}
+    for result in results:
+        if not isinstance(result, dict) or result.get('verification_result') not in ('Supported', 'Refuted', None):
+            continue
+        label = str(result.get('id', '')).strip()
+        if label in {f'c{n}' for n in range(1, count + 1)}:
+            verdicts[label] = result
+    return verdicts
+
+
+class VerificationBatcher():
+    # Collects verification requests from concurrent claims and sends them `batch_size` at a time,
+    # or after `max_wait` seconds for a partial batch. `send` takes a list of (id, claim, sim_output)
+    # and returns the verification response text for each, in order.
+    def __init__(self, send, batch_size=10, max_wait=2.0):
+        self.send = send
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+
+    async def verify(self, id, sim_output, claim):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((id, claim, sim_output, future))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        items, self.pending = self.pending, []
+        task = asyncio.create_task(self.send_items(items))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send_items(self, items):
+        try:
+            responses = await self.send([(id, claim, sim_output) for id, claim, sim_output, _ in items])
+        except Exception as e:
+            for *_, future in items:
+                future.set_exception(e)
+            return
+        for (*_, future), response in zip(items, responses):
+            future.set_result(response)
@@ -0,0 +1,84 @@
+import glob
+import json
+import os
+import re
+from ast import literal_eval
+
+
+VERDICTS = ('Supported', 'Refuted')
+
+VERIFICATION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'claim': {'type': 'string'},
+        'verification_result': {'type': ['string', 'null'], 'enum': ['Supported', 'Refuted', None]},
+        'reason': {'type': 'string'},
+    },
+    'required': ['claim', 'verification_result', 'reason'],
+    'additionalProperties': False,
+}
+
+# structured output: the model can only answer with a verdict object matching the schema
+VERIFICATION_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {'name': 'verification', 'strict': True, 'schema': VERIFICATION_SCHEMA},
+}
+
+
+def parse_verification(content, claim=None):
+    # The verdict dict of a verification reply. Never raises: replies recorded before structured
+    # output (python dicts, often fenced) are read with literal_eval, and anything unreadable
+    # becomes a None verdict whose reason says so.
+    text = re.sub(r'```(?:python|json)?', '', content or '').strip()
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        try:
+            parsed = literal_eval(text)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            parsed = None
+
+    if not isinstance(parsed, dict):
+        return {'claim': claim, 'verification_result': None, 'reason': f"unreadable verification reply: {text[:200]!r}"}
+    verdict = parsed.get('verification_result')
+    return {
+        'claim': parsed.get('claim', claim),
+        'verification_result': verdict if verdict in VERDICTS else None,
+        'reason': parsed.get('reason'),
+    }
+
+
+def save_verdict(results_dir, id, verdict):
+    with open(f'{results_dir}/verdict_{id}.json', 'w', encoding='utf-8') as f:
+        json.dump(verdict, f, ensure_ascii=False)
+
+
+def save_verification(results_dir, id, verdict, content=None, prompt=None):
+    # Writes a claim's verification: the reply as response_{id}.txt, its verdict as verdict_{id}.json and,
+    # if given, the prompt it answered. A verdict reached without a reply of its own (from the simulation
+    # output, a vote or a batched reply) is written as the JSON reply it stands for. Returns the reply
+    os.makedirs(results_dir, exist_ok=True)
+    if prompt is not None:
+        with open(f'{results_dir}/prompt_{id}.txt', 'w', encoding='utf-8') as f:
+            f.write(prompt)
+    if content is None:
+        content = json.dumps({key: verdict[key] for key in ('claim', 'verification_result', 'reason')}, ensure_ascii=False)
+    with open(f'{results_dir}/response_{id}.txt', 'w', encoding='utf-8') as f:
+        f.write(content)
+    save_verdict(results_dir, id, verdict)
+    return content
+
+
+def load_verdicts(results_dir='gpt_ver_results'):
+    # Artifact id -> verdict for every verification in results_dir, from verdict_*.json where it
+    # exists and from the raw response_*.txt reply otherwise
+    verdicts = {}
+    for path in glob.glob(os.path.join(results_dir, 'response_*.txt')):
+        id = re.match(r'response_(.*)\.txt$', os.path.basename(path)).group(1)
+        with open(path, 'r', encoding='utf-8') as f:
+            verdicts[id] = parse_verification(f.read())
+    for path in glob.glob(os.path.join(results_dir, 'verdict_*.json')):
+        id = re.match(r'verdict_(.*)\.json$', os.path.basename(path)).group(1)
+        with open(path, 'r', encoding='utf-8') as f:
+            verdicts[id] = json.load(f)
+    return verdicts